@@ -0,0 +1,273 @@
+#--------------------------------------------------------------------------
+# benchmark.py
+# Benchmarks of the rendering and transfer hot paths. Needs no display:
+# transfers go to an ff32emu.EmulatedFF32 that only counts the I2C writes.
+#
+# For every benchmark it reports ops/sec and, for benchmarks that talk to
+# the display, the I2C transactions and bytes per operation (= per frame).
+# Bitmap benchmarks run for the pure Python and (if NumPy is installed)
+# the NumPy Bitmap. The text and scroll benchmarks use font5x8 and
+# arial_16/arial_24 when those font modules can be imported, and otherwise
+# synthetic fonts of the same sizes (named synthetic_...), so they also run
+# on a headless machine without the fonts.
+#
+# Usage:
+#   python benchmark.py                           run all benchmarks
+#   python benchmark.py -k text                   only benchmarks with "text" in their name
+#   python benchmark.py --json results.json       also save the results
+#   python benchmark.py --compare results.json    compare with saved results
+#--------------------------------------------------------------------------
+
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+import ff32emu
+import ff32ssd1306
+
+try:
+    import ff32numpy
+except ImportError:
+    ff32numpy = None
+
+# Proportional font with the attributes of the font modules (like arial_16),
+# glyphs of pseudo random rows, for when the font modules are not installed
+class SyntheticFont:
+
+    start_char = "!"
+    end_char = "~"
+
+    def __init__(self, char_height):
+        self.char_height = char_height
+        self.space_width = char_height // 4
+        self.gap_width = 2
+        count = ord(self.end_char) - ord(self.start_char) + 1
+        r = random.Random(char_height)
+        self.descriptors = []
+        self.bitmaps = []
+        for pos in range(0, count):
+            width = r.randrange(char_height // 3, char_height * 2 // 3 + 1)
+            self.descriptors.append((width, len(self.bitmaps)))
+            self.bitmaps += [r.randrange(256) for i in range(0, char_height * ((width + 7) // 8))]
+        self.kerning = [[r.randrange(-1, 1) for pos in range(0, count)] for prev in range(0, count)]
+
+# Fixed 5x8 font with the attributes of font5x8.Font5x8
+class SyntheticFixedFont:
+
+    rows = 8
+    cols = 5
+
+    def __init__(self):
+        r = random.Random(5)
+        self.bytes = [r.randrange(256) for i in range(0, 256 * self.cols)]
+
+try:
+    import font5x8
+    TEXT_FONT = ("font5x8", font5x8.Font5x8)
+except ImportError:
+    TEXT_FONT = ("synthetic_5x8", SyntheticFixedFont())
+
+FONTS = []
+for (name, height) in (("arial_16", 16), ("arial_24", 24)):
+    try:
+        FONTS.append((name, __import__(name)))
+    except ImportError:
+        FONTS.append(("synthetic_%d" % height, SyntheticFont(height)))
+
+REGRESSION = 0.10   # default: report slowdowns and extra bus traffic above 10%
+
+LIST_ITEMS = ["Item %d" % i for i in range(0, 20)] + ["A list item that is far too wide to fit on the display"]
+
+# Returns (ops per second, nr of calls) of func, measured for about duration seconds
+def measure(func, duration):
+    count = 0
+    start = time.time()
+    elapsed = 0
+    while elapsed < duration:
+        func()
+        count += 1
+        elapsed = time.time() - start
+    return (count / elapsed, count)
+
+def new_display(bitmap_class=None, **kwargs):
+    transport = ff32emu.EmulatedFF32(emulate=False)
+    oled = ff32ssd1306.SSD1306(session=transport, bitmap_class=bitmap_class, **kwargs)
+    oled.begin()
+    oled.display()
+    return (oled, transport)
+
+# Each benchmark function returns (name, func, transport); transport is None
+# for benchmarks that do not talk to the display.
+def bitmap_benchmarks(suffix, bitmap_class):
+    bitmap = bitmap_class(128, 64)
+    logo = bitmap_class(40, 24)
+    logo.fill_block(0, 0, 40, 24)
+    return [("bitmap.clear" + suffix, bitmap.clear, None),
+            ("bitmap.clear_block(0,40,128,60)" + suffix, lambda: bitmap.clear_block(0, 40, 128, 60), None),
+            ("bitmap.fill_block(3,5,100,50)" + suffix, lambda: bitmap.fill_block(3, 5, 100, 50), None),
+            ("bitmap.invert_block(0,0,128,64)" + suffix, lambda: bitmap.invert_block(0, 0, 128, 64), None),
+            ("bitmap.blit 40x24 aligned" + suffix, lambda: bitmap.blit(logo, 10, 16), None),
+            ("bitmap.blit 40x24 unaligned" + suffix, lambda: bitmap.blit(logo, 11, 13), None),
+            ("bitmap.line (0,0)-(127,40)" + suffix, lambda: bitmap.line(0, 0, 127, 40), None),
+            ("bitmap.rect 100x50" + suffix, lambda: bitmap.rect(3, 5, 100, 50), None),
+            ("bitmap.circle r 20" + suffix, lambda: bitmap.circle(64, 32, 20), None),
+            ("bitmap.fill_circle r 20" + suffix, lambda: bitmap.fill_circle(64, 32, 20), None)]
+
+def text_benchmarks():
+    (oled, transport) = new_display(font=TEXT_FONT[1])
+    bitmap = oled.bitmap
+    cache = bitmap.glyph_cache
+    def cold(func):
+        def run():
+            cache.clear()
+            func()
+        return run
+    name = TEXT_FONT[0]
+    benchmarks = [("text.draw_text " + name, lambda: oled.draw_text(0, 3, "Hello World"), None),
+                  ("text.draw_text2 " + name + " size 3", lambda: oled.draw_text2(0, 20, "12:34", 3), None),
+                  ("text.draw_text2 " + name + " size 3 cold cache", cold(lambda: oled.draw_text2(0, 20, "12:34", 3)), None)]
+    for (name, font) in FONTS:
+        benchmarks += [("text.draw_text3 " + name, lambda font=font: bitmap.draw_text(0, 21, "19Aug 12:34", font), None),
+                       ("text.draw_text3 " + name + " cold cache", cold(lambda font=font: bitmap.draw_text(0, 21, "19Aug 12:34", font)), None),
+                       ("text.draw_text3 " + name + " size 2", lambda font=font: bitmap.draw_text(0, 8, "12:34", font, 2), None),
+                       ("text.text_width " + name, lambda font=font: bitmap.text_width("19Aug 12:34", font), None)]
+    return benchmarks
+
+def full_frame():
+    (oled, transport) = new_display()
+    oled.bitmap.fill_block(0, 0, 128, 64)
+    def run():
+        oled.shadow = None
+        oled.display()
+    return ("transfer.display full frame", run, transport)
+
+# A 5 digit counter in one page, each digit drawn as its 4 bits (2 rows per bit)
+def partial_update():
+    (oled, transport) = new_display()
+    counter = [0]
+    def run():
+        counter[0] += 1
+        oled.clear_block(90, 40, 38, 8)
+        for (i, digit) in enumerate("%05d" % (counter[0] % 100000)):
+            for bit in range(0, 4):
+                if int(digit) >> bit & 1:
+                    oled.fill_rect(90 + i * 7, 40 + bit * 2, 6, 2)
+        oled.display()
+    return ("transfer.display partial update (5 digit bit cells)", run, transport)
+
+def unchanged():
+    (oled, transport) = new_display()
+    return ("transfer.display unchanged", oled.display, transport)
+
+def display_block():
+    (oled, transport) = new_display()
+    block = oled.Bitmap(128, 16)
+    return ("transfer.display_block 128x16", lambda: oled.display_block(block, 16, 0, 128), transport)
+
+def transfer_benchmarks():
+    return [full_frame(), partial_update(), unchanged(), display_block()]
+
+def list_construction(font):
+    (oled, transport) = new_display()
+    return ("scroll.ScrollingList construction (%d items)" % len(LIST_ITEMS),
+            lambda: oled.ScrollingList(oled, LIST_ITEMS, font), transport)
+
+def scroll_step(font):
+    (oled, transport) = new_display()
+    scrolling_list = oled.ScrollingList(oled, LIST_ITEMS, font)
+    return ("scroll.scroll step", lambda: scrolling_list.scroll(1), transport)
+
+def pan_step(font, hardware_pan):
+    (oled, transport) = new_display()
+    scrolling_list = oled.ScrollingList(oled, LIST_ITEMS, font, hardware_pan=hardware_pan)
+    if hardware_pan:
+        return ("scroll.auto_pan step (hardware)", scrolling_list.auto_pan, transport)
+    scrolling_list.scroll(-oled.rows)   # to the wide last item
+    return ("scroll.auto_pan step (software)", scrolling_list.auto_pan, transport)
+
+def scroll_benchmarks():
+    font = FONTS[0][1]
+    return [list_construction(font), scroll_step(font), pan_step(font, False), pan_step(font, True)]
+
+def all_benchmarks():
+    benchmarks = bitmap_benchmarks("", ff32ssd1306.SSD1306.Bitmap)
+    if ff32numpy is not None:
+        benchmarks += bitmap_benchmarks(" [numpy]", ff32numpy.NumpyBitmap)
+    benchmarks += text_benchmarks()
+    benchmarks += transfer_benchmarks()
+    benchmarks += scroll_benchmarks()
+    return benchmarks
+
+def run(benchmarks, duration):
+    results = {}
+    print("{:<52}{:>12}{:>10}{:>10}".format("benchmark", "ops/sec", "tx/op", "bytes/op"))
+    for (name, func, transport) in benchmarks:
+        if transport is not None:
+            transport.reset_counters()
+        (ops_per_sec, count) = measure(func, duration)
+        result = {"ops_per_sec": ops_per_sec}
+        line = "{:<52}{:>12.1f}".format(name, ops_per_sec)
+        if transport is not None:
+            result["transactions_per_op"] = float(transport.transactions) / count
+            result["bytes_per_op"] = float(transport.bytes_sent) / count
+            line += "{:>10.2f}{:>10.1f}".format(result["transactions_per_op"], result["bytes_per_op"])
+        print(line)
+        results[name] = result
+    return results
+
+# Prints the changes against earlier results; returns the nr of regressions
+def compare(results, baseline, threshold=REGRESSION):
+    regressions = 0
+    print("")
+    print("{:<52}{:>12}{:>10}{:>10}".format("compared to " + baseline["meta"]["date"], "speed", "tx", "bytes"))
+    for (name, result) in sorted(results.items()):
+        if name not in baseline["results"]:
+            continue
+        old = baseline["results"][name]
+        speed = result["ops_per_sec"] / old["ops_per_sec"]
+        line = "{:<52}{:>11.2f}x".format(name, speed)
+        regression = speed < 1 - threshold
+        for key in ("transactions_per_op", "bytes_per_op"):
+            if key in result and key in old:
+                line += "{:>+10.1f}".format(result[key] - old[key])
+                if result[key] > old[key] * (1 + threshold):
+                    regression = True
+        if regression:
+            line += "  REGRESSION"
+            regressions += 1
+        print(line)
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks of ff32ssd1306 rendering and transfers")
+    parser.add_argument("-d", "--duration", type=float, default=0.5, help="seconds per benchmark")
+    parser.add_argument("-k", "--filter", default="", help="only run benchmarks containing this text")
+    parser.add_argument("--json", help="save the results to this file")
+    parser.add_argument("--compare", help="compare with results saved earlier; exits with 1 on regressions")
+    parser.add_argument("--threshold", type=float, default=REGRESSION, help="relative change counted as regression")
+    args = parser.parse_args()
+
+    benchmarks = [benchmark for benchmark in all_benchmarks() if args.filter in benchmark[0]]
+    if ff32numpy is None:
+        print("numpy not available, skipping the NumPy Bitmap")
+    synthetic = [name for (name, font) in [TEXT_FONT] + FONTS if name.startswith("synthetic")]
+    if synthetic:
+        print("font modules not available, using " + ", ".join(synthetic))
+    results = run(benchmarks, args.duration)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"meta": {"date": time.strftime("%Y-%m-%d %H:%M:%S"),
+                                "python": platform.python_version(),
+                                "machine": platform.machine(),
+                                "duration": args.duration},
+                       "results": results}, f, indent=2, sort_keys=True)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.threshold):
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
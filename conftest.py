@@ -0,0 +1,6 @@
+# pytest: test_ff32async.py needs Python 3.5 (ff32async uses async/await)
+import sys
+
+collect_ignore = []
+if sys.version_info < (3, 5):
+    collect_ignore.append("test_ff32async.py")
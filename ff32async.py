@@ -0,0 +1,145 @@
+#-----------------------------------------------------------------------------------------
+# ff32async.py
+# About:
+# asyncio API for ff32ssd1306, so display updates, ScrollingList animations and
+# sensor reads can be interleaved on one event loop. Requires Python 3.5 or later.
+#
+# Blocking FF32 I/O runs in an executor: by default one worker thread per display,
+# which keeps the transfers to a display in order. Drawing into the bitmap is not
+# I/O and is done directly on the SSD1306 object. Frames are sent by the writer
+# thread of the SSD1306 (started if needed): display() copies the bitmap on the
+# event loop thread before it awaits the transfer, so drawing done meanwhile is
+# kept for the next frame.
+#
+# Usage:
+#   oled = ff32async.AsyncSSD1306(ff32ssd1306.SSD1306())
+#   menu = ff32async.AsyncScrollingList(oled, ff32ssd1306.SSD1306.ScrollingList(oled.ssd1306, items, arial_16))
+#
+#   async def clock():
+#       pacer = ff32async.Pacer(1.0)
+#       while True:
+#           oled.ssd1306.clear_block(0, 0, 128, 16)
+#           oled.ssd1306.draw_text3(0, 0, time.strftime("%H:%M:%S"), arial_16)
+#           await oled.display()
+#           await pacer.wait()
+#
+#   async def pan():
+#       pacer = ff32async.Pacer(0.02)
+#       while True:
+#           await menu.auto_pan()
+#           await pacer.wait()
+#-----------------------------------------------------------------------------------------
+
+import asyncio
+import concurrent.futures
+import functools
+
+# Paces a loop at a fixed interval: wait() sleeps until the next tick, measured from
+# the first call, so time spent in the loop body does not make the frame rate drift.
+# When the loop falls behind, missed ticks are skipped.
+class Pacer:
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.next_tick = None
+
+    async def wait(self):
+        loop = asyncio.get_event_loop()
+        now = loop.time()
+        if self.next_tick is None:
+            self.next_tick = now
+        self.next_tick += self.interval
+        if self.next_tick < now and self.interval > 0:
+            self.next_tick = now + self.interval - (now - self.next_tick) % self.interval
+        await asyncio.sleep(self.next_tick - now)
+
+class AsyncSSD1306:
+
+    # ssd1306:  the ff32ssd1306.SSD1306 to drive
+    # executor: concurrent.futures executor for the blocking I/O. Defaults to a
+    #           single worker thread for this display.
+    def __init__(self, ssd1306, executor=None):
+        self.ssd1306 = ssd1306
+        if ssd1306.writer is None:
+            ssd1306.start_writer()
+        if executor is None:
+            executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        self.executor = executor
+
+    # Runs func(*args) in the executor, after the frames queued so far were sent,
+    # and returns its result
+    async def run(self, func, *args):
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(self.call, func, *args))
+
+    def call(self, func, *args):
+        self.ssd1306.wait_idle()
+        return func(*args)
+
+    async def begin(self, vcc_state=None):
+        if vcc_state is None:
+            vcc_state = self.ssd1306.SWITCH_CAP_VCC
+        await self.run(self.ssd1306.begin, vcc_state)
+
+    # Queues the bitmap for the writer thread (a copy is taken here, on the event
+    # loop thread) and waits until it has been sent
+    async def display(self):
+        self.ssd1306.display()
+        await self.run(self.ssd1306.wait_idle)
+
+    async def display_block(self, bitmap, row, col, col_count, col_offset=0):
+        await self.run(self.ssd1306.display_block, bitmap, row, col, col_count, col_offset)
+
+    async def command(self, *commandbytes):
+        await self.run(self.ssd1306.command, *commandbytes)
+
+    async def commands(self, *commands):
+        await self.run(self.ssd1306.commands, *commands)
+
+    async def invert_display(self):
+        await self.run(self.ssd1306.invert_display)
+
+    async def normal_display(self):
+        await self.run(self.ssd1306.normal_display)
+
+    async def set_contrast(self, contrast=0x8f):
+        await self.run(self.ssd1306.set_contrast, contrast)
+
+    async def flip_display(self, flipped=True):
+        await self.run(self.ssd1306.flip_display, flipped)
+
+    async def close(self):
+        await self.run(self.ssd1306.close)
+
+class AsyncScrollingList:
+
+    # display:        AsyncSSD1306 the list is shown on
+    # scrolling_list: ff32ssd1306.SSD1306.ScrollingList on display.ssd1306
+    def __init__(self, display, scrolling_list):
+        self.display = display
+        self.list = scrolling_list
+
+    # scroll up or down by delta pixels, one step at a time. With an interval
+    # the steps are paced at that many seconds.
+    async def scroll(self, delta, interval=0):
+        if delta == 0:
+            return
+        step = 1 if delta > 0 else -1
+        pacer = Pacer(interval)
+        for i in range(0, abs(delta)):
+            if i > 0 and interval > 0:
+                await pacer.wait()
+            await self.display.run(self.list.scroll_step, step)
+
+    # scrolls to the nearest home position, one step every delay seconds
+    async def align(self, delay=0.005):
+        await self.scroll(self.list.align_offset(), delay)
+        await self.prefetch()
+        return self.list.position // self.list.rows
+
+    # renders the item the next scroll step will show, see ScrollingList.prefetch
+    async def prefetch(self):
+        await self.display.run(self.list.prefetch)
+
+    async def auto_pan(self):
+        await self.display.run(self.list.auto_pan)
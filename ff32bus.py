@@ -0,0 +1,263 @@
+#-----------------------------------------------------------------------------------------
+# ff32bus.py
+# About:
+# Persistent session on a FlyFish technology FF32 interface chip (www.flyfish-tech.com).
+# Opening the FF32 over USB is expensive compared to a single I2C write, so instead of
+# wrapping every write in "with pyff32.FF32() as ff32:" drivers share one open session.
+#
+# Usage:
+#   session = ff32bus.FF32Session.shared()   # one session per process
+#   session.open()
+#   session.set_pins(("A",5), ("A",6))
+#   session.write(0x3C, bytearray([0x00, 0xAF]))
+#   session.close()
+#
+# open()/close() are reference counted, so several drivers (SSD1306, DS18B20, ...)
+# can each open and close the shared session; the device is only released when the
+# last user closes it. The session can also be used as a context manager.
+# When a write fails the device is reopened, the last I2C pin configuration is
+# restored and the write is retried. The pins are only reprogrammed when they change.
+#
+# The SSD1306 driver writes through a transport: FF32Session for a real FF32, or
+# ff32emu.EmulatedFF32 to run without hardware (tests, benchmarks). Transports
+# derive from Transport, which does the reference counting, locking and pin tracking.
+#
+# FF32Bus (below) runs several SSD1306 displays on one FF32.
+#-----------------------------------------------------------------------------------------
+
+import threading
+
+try:
+    import pyff32
+except ImportError:
+    pyff32 = None   # only needed by FF32Session, emulated transports work without it
+
+# Base class of the transports. Subclasses implement is_open(), _connect(),
+# _disconnect(), _set_pins(scl_pin, sda_pin) and _write(slave_addr, data).
+class Transport:
+
+    def __init__(self):
+        self.users = 0
+        self.pins = None
+        self.pin_changes = 0
+        self.opens = 0
+        # RLock: drivers may hold the lock around a sequence of writes
+        self.lock = threading.RLock()
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    # Registers a user of the transport and opens the device if needed
+    def open(self):
+        with self.lock:
+            self.users += 1
+            if not self.is_open():
+                self._connect()
+
+    # Unregisters a user of the transport. The device is closed when the last user is gone
+    def close(self):
+        with self.lock:
+            if self.users > 0:
+                self.users -= 1
+            if self.users == 0:
+                self._disconnect()
+
+    # Configures the I2C bus on the FF32 chip. The configuration is remembered
+    # so it can be restored after a reconnect, and the FF32 is only reprogrammed
+    # when the pins change (or force is set).
+    def set_pins(self, scl_pin, sda_pin, force=False):
+        with self.lock:
+            if self.pins == (scl_pin, sda_pin) and self.is_open() and not force:
+                return
+            self.pins = (scl_pin, sda_pin)
+            self.pin_changes += 1
+            self._set_pins(scl_pin, sda_pin)
+
+    # Forgets the active pin configuration, for when something outside this
+    # transport reprogrammed the FF32
+    def invalidate_pins(self):
+        with self.lock:
+            self.pins = None
+
+    # Writes data to slave_addr. With pins (scl_pin, sda_pin) given, the I2C bus
+    # is switched to those pins first if needed.
+    def write(self, slave_addr, data, pins=None):
+        with self.lock:
+            if pins is not None and pins != self.pins:
+                self.set_pins(*pins)
+            self._write(slave_addr, data)
+
+class FF32Session(Transport):
+
+    RETRIES = 1     # Nr of reconnect attempts after a failed write
+
+    _shared = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self, retries=RETRIES):
+        Transport.__init__(self)
+        self.retries = retries
+        self.device = None
+        self.ff32 = None
+
+    # Returns the process wide session shared by all FF32 drivers
+    @classmethod
+    def shared(cls):
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls()
+            return cls._shared
+
+    def is_open(self):
+        return self.ff32 is not None
+
+    def _set_pins(self, scl_pin, sda_pin):
+        self._call(lambda ff32: ff32.setI2CPins(scl_pin, sda_pin))
+
+    def _write(self, slave_addr, data):
+        self._call(lambda ff32: ff32.writeBlockI2C(slave_addr, data))
+
+    # Runs operation(ff32) on the open device. On failure the device is
+    # reopened (restoring the I2C pins) and the operation is retried.
+    def _call(self, operation):
+        attempt = 0
+        while True:
+            if self.ff32 is None:
+                self._connect()
+                if self.pins is not None:
+                    self.ff32.setI2CPins(*self.pins)
+            try:
+                return operation(self.ff32)
+            except Exception:
+                self._disconnect()
+                if attempt >= self.retries:
+                    raise
+                attempt += 1
+
+    # Same protocol as "with pyff32.FF32() as ff32:", but kept open
+    def _connect(self):
+        if pyff32 is None:
+            raise ImportError("pyff32 is needed to talk to a FF32")
+        device = pyff32.FF32()
+        self.ff32 = device.__enter__()
+        self.device = device
+        self.opens += 1
+
+    def _disconnect(self):
+        device = self.device
+        self.ff32 = None
+        self.device = None
+        if device is not None:
+            try:
+                device.__exit__(None, None, None)
+            except Exception:
+                pass
+
+# Manages several SSD1306 displays on one FF32, at different I2C addresses and/or
+# on different pin pairs. The bus owns the session and one writer thread that sends
+# the frames of all its displays:
+#   bus = ff32bus.FF32Bus()
+#   left = ff32ssd1306.SSD1306(slave_addr=0x3C, bus=bus)
+#   right = ff32ssd1306.SSD1306(slave_addr=0x3D, bus=bus)
+#   ... draw ...
+#   left.display(); right.display()   # queue frames, returns at once
+#   bus.wait_idle()
+#
+# Scheduling is done in rounds: every display with a queued frame gets its latest
+# frame sent once per round, so a busy display cannot starve the others. Within a
+# round the displays are grouped by pin configuration, starting with the active
+# one, so the FF32 pins are reprogrammed at most once per configuration per round.
+class FF32Bus:
+
+    def __init__(self, session=None):
+        if session is None:
+            session = FF32Session.shared()
+        self.session = session
+        self.displays = []
+        self.frame_ready = threading.Condition()
+        self.thread = None
+        self.stopping = False
+        self.rounds = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    # Called by SSD1306.start_writer(bus): the bus thread now sends its frames
+    def attach(self, display):
+        with self.frame_ready:
+            if display not in self.displays:
+                self.displays.append(display)
+            if self.thread is None:
+                self.stopping = False
+                self.thread = threading.Thread(target=self.run)
+                self.thread.daemon = True
+                self.thread.start()
+
+    def detach(self, display):
+        with self.frame_ready:
+            if display in self.displays:
+                self.displays.remove(display)
+
+    # Waits until the frames of all displays are sent.
+    # Returns False if that did not happen within timeout seconds.
+    def wait_idle(self, timeout=None):
+        for display in list(self.displays):
+            if not display.wait_idle(timeout):
+                return False
+        return True
+
+    # Sends the queued frames and stops the bus thread. The displays are detached
+    # and send their frames themselves again (synchronously) from then on.
+    def stop(self):
+        for display in list(self.displays):
+            display.stop_writer()
+        with self.frame_ready:
+            thread = self.thread
+            self.stopping = True
+            self.frame_ready.notify_all()
+        if thread is not None:
+            thread.join()
+        self.thread = None
+
+    # The displays with a queued frame, grouped by pins starting with the active ones.
+    # Called with frame_ready held.
+    def schedule(self):
+        pending = [display for display in self.displays if display.frame_pending]
+        groups = []
+        for display in pending:
+            for group in groups:
+                if group[0].pins == display.pins:
+                    group.append(display)
+                    break
+            else:
+                groups.append([display])
+        groups.sort(key=lambda group: group[0].pins != self.session.pins)
+        batch = []
+        for group in groups:
+            batch += group
+        return batch
+
+    def run(self):
+        while True:
+            with self.frame_ready:
+                batch = self.schedule()
+                while not batch and not self.stopping:
+                    self.frame_ready.wait()
+                    batch = self.schedule()
+                if not batch:
+                    return
+                frames = [(display, display.take_frame()) for display in batch]
+                self.rounds += 1
+            for (display, col_offset) in frames:
+                display.send_taken(col_offset)
+            with self.frame_ready:
+                for (display, col_offset) in frames:
+                    display.frame_done()
+                self.frame_ready.notify_all()
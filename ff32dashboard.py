@@ -0,0 +1,192 @@
+#-----------------------------------------------------------------------------------------
+# ff32dashboard.py
+# About:
+# Dashboard layer on top of ff32ssd1306.SSD1306: named regions (widgets) on the display,
+# each showing the value of its own data source, read at its own interval.
+#
+# Usage:
+#   dashboard = ff32dashboard.Dashboard(oled)
+#   dashboard.add("clock", lambda: time.strftime("%H:%M"), 1, (0, 0, 128, 16), arial_16)
+#   dashboard.add("temperature", sensor.Read_Temp, 5, (0, 40, 128, 24), arial_24, "{:.1f} C")
+#   dashboard.run()
+#
+# The sources are read by a pool of worker threads, so a slow sensor (a DS18B20
+# conversion takes most of a second) does not hold up the other widgets or the display.
+# The display itself is only drawn and updated from the thread running the dashboard.
+# A widget is redrawn only when its formatted value changes, and display() is only
+# called when a widget was redrawn; as display() sends just the changed parts of the
+# bitmap, unchanged regions cost nothing on the bus.
+#
+# When a source raises an exception the widget keeps showing its last value; the
+# exception is kept in widget.error. Sources using the FF32 of the display must
+# hold oled.session.lock around their transfers; the display waits while a source
+# holds it, so keep waits such as a sensor conversion outside the lock where the
+# sensor driver allows it.
+#-----------------------------------------------------------------------------------------
+
+import threading
+import time
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue   # Python 2
+
+class Widget:
+
+    # name:     name of the widget, dashboard[name] returns it
+    # source:   function returning the value to show, called on a worker thread
+    # interval: seconds between reads of the source
+    # region:   (x, y, w, h) of the display area the widget draws in
+    # font:     proportional font (like arial_16) of the text
+    # format:   format string (str.format of the value) or function value -> text
+    # render:   optional function render(display, widget, text) drawing the widget
+    #           instead of the text (e.g. a gauge); it should stay inside region
+    def __init__(self, name, source, interval, region, font, format="{}", render=None):
+        self.name = name
+        self.source = source
+        self.interval = interval
+        self.region = region
+        self.font = font
+        self.format = format
+        self.render = render
+        self.value = None
+        self.text = None
+        self.error = None
+        self.polling = False
+        self.next_poll = None   # time the source is due again, None before the first read
+        self.polls = 0
+        self.redraws = 0
+
+    def format_value(self, value):
+        if callable(self.format):
+            return self.format(value)
+        return self.format.format(value)
+
+    # Draws text into the region of display's bitmap
+    def draw(self, display, text):
+        if self.render is not None:
+            self.render(display, self, text)
+            return
+        (x, y, w, h) = self.region
+        # drawn in a bitmap of its own, so the text is clipped to the region
+        bitmap = display.Bitmap(w, (h + 7) // 8 * 8)
+        bitmap.draw_text(0, 0, text, self.font)
+        display.blit(bitmap, x, y, w, h)
+
+class Dashboard:
+
+    WORKERS = 2     # Default nr of threads reading the sources
+
+    def __init__(self, display, workers=WORKERS):
+        self.display = display
+        self.workers = workers
+        self.widgets = []
+        self.polls = queue.Queue()
+        self.threads = []
+        self.updated = threading.Condition()
+        self.results = []
+        self.stopping = False
+
+    # Adds a Widget (see there for the arguments) and returns it
+    def add(self, name, source, interval, region, font, format="{}", render=None):
+        widget = Widget(name, source, interval, region, font, format, render)
+        self.widgets.append(widget)
+        return widget
+
+    def __getitem__(self, name):
+        for widget in self.widgets:
+            if widget.name == name:
+                return widget
+        raise KeyError(name)
+
+    # Starts the worker threads; run() does, call it before using step() directly
+    def start(self):
+        self.stopping = False
+        while len(self.threads) < self.workers:
+            thread = threading.Thread(target=self.worker)
+            thread.daemon = True
+            thread.start()
+            self.threads.append(thread)
+
+    # Stops run() and the worker threads. Sources being read are not interrupted.
+    def stop(self):
+        with self.updated:
+            self.stopping = True
+            self.updated.notify_all()
+        for thread in self.threads:
+            self.polls.put(None)
+        for thread in self.threads:
+            if thread is not threading.current_thread():
+                thread.join()
+        self.threads = []
+
+    def worker(self):
+        while True:
+            widget = self.polls.get()
+            if widget is None:
+                return
+            try:
+                result = (widget.source(), None)
+            except Exception as e:
+                result = (None, e)
+            with self.updated:
+                self.results.append((widget, result))
+                self.updated.notify_all()
+
+    # Queues the sources that are due for reading; returns the time the next one is due
+    def poll(self, now):
+        next_due = None
+        for widget in self.widgets:
+            if not widget.polling and (widget.next_poll is None or now >= widget.next_poll):
+                widget.polling = True
+                widget.polls += 1
+                # fixed schedule from the first read on, unless the source fell a
+                # whole interval behind
+                if widget.next_poll is None:
+                    widget.next_poll = now
+                widget.next_poll = max(widget.next_poll + widget.interval, now)
+                self.polls.put(widget)
+            if not widget.polling and (next_due is None or widget.next_poll < next_due):
+                next_due = widget.next_poll
+        return next_due
+
+    # One round: reads the due sources, waits (at most timeout seconds) for values,
+    # redraws the widgets whose text changed and updates the display.
+    # Returns the nr of widgets redrawn.
+    def step(self, timeout=None):
+        now = time.time()
+        next_due = self.poll(now)
+        with self.updated:
+            if not self.results and not self.stopping:
+                wait = timeout
+                if next_due is not None and (wait is None or next_due - now < wait):
+                    wait = max(next_due - now, 0)
+                self.updated.wait(wait)
+            results = self.results
+            self.results = []
+        redrawn = 0
+        for (widget, (value, error)) in results:
+            widget.polling = False
+            widget.error = error
+            if error is not None:
+                continue
+            widget.value = value
+            text = widget.format_value(value)
+            if text != widget.text:
+                widget.text = text
+                widget.draw(self.display, text)
+                widget.redraws += 1
+                redrawn += 1
+        if redrawn:
+            self.display.display()
+        return redrawn
+
+    # Runs the dashboard until stop() is called
+    def run(self):
+        self.start()
+        try:
+            while not self.stopping:
+                self.step(1.0)
+        finally:
+            self.stop()
@@ -0,0 +1,270 @@
+#-----------------------------------------------------------------------------------------
+# ff32emu.py
+# About:
+# In-process stand in for a FF32 with SSD1306 displays attached, to run the driver
+# without a USB device: for tests that check what ends up on the panel and for
+# benchmarks that count I2C transactions and bytes.
+#
+# Usage:
+#   transport = ff32emu.EmulatedFF32()
+#   oled = ff32ssd1306.SSD1306(session=transport)
+#   oled.begin()
+#   oled.draw_text(0, 0, "Hello")
+#   oled.display()
+#   panel = transport.panel(0x3C)
+#   panel.ram_columns(8) == oled.bitmap.data   # display ram in Bitmap layout
+#   panel.dump()                                # prints what the panel shows
+#   transport.transactions, transport.bytes_sent
+#
+# SSD1306Emulator decodes the COMMAND_MODE/DATA_MODE streams: it keeps the display ram
+# (GDDRAM, 8 pages of 128 columns) with horizontal, vertical and page addressing,
+# the column/page address windows, start line, display offset, segment remap, COM
+# scan direction, contrast, inversion and display on/off. The scroll engine is
+# registered (scroll_active, scroll_setup) but its movement is not emulated.
+#-----------------------------------------------------------------------------------------
+
+import time
+import ff32bus
+
+class SSD1306Emulator:
+
+    RAM_PAGES = 8
+    RAM_COLS  = 128
+
+    # Nr of parameter bytes following each command byte with parameters
+    PARAMS = {0x20: 1, 0x21: 2, 0x22: 2, 0x26: 6, 0x27: 6, 0x29: 5, 0x2A: 5,
+              0x81: 1, 0x8D: 1, 0xA3: 2, 0xA8: 1, 0xD3: 1, 0xD5: 1, 0xD9: 1,
+              0xDA: 1, 0xDB: 1}
+
+    def __init__(self, rows=64, cols=128):
+        self.rows = rows
+        self.cols = cols
+        self.ram = bytearray(self.RAM_PAGES * self.RAM_COLS)  # page after page
+        self.pending = []
+        self.commands_received = 0
+        self.data_received = 0
+        self.reset()
+
+    # Register values after power on
+    def reset(self):
+        self.memory_mode = 0x02
+        self.col_start = 0
+        self.col_end = self.RAM_COLS - 1
+        self.page_start = 0
+        self.page_end = self.RAM_PAGES - 1
+        self.col = 0
+        self.page = 0
+        self.start_line = 0
+        self.display_offset = 0
+        self.multiplex = 63
+        self.seg_remap = 0
+        self.com_scan_dec = False
+        self.contrast = 0x7F
+        self.inverted = False
+        self.entire_on = False
+        self.display_on = False
+        self.scroll_active = False
+        self.scroll_setup = None
+        self.vert_scroll_area = (0, 64)
+        self.registers = {}
+
+    # One I2C write to this display: a control byte followed by a command or data stream
+    def write(self, data):
+        data = bytearray(data)
+        i = 0
+        while i < len(data):
+            control = data[i]
+            i += 1
+            if control & 0x80:
+                # Co=1: one byte, then another control byte
+                chunk = data[i:i + 1]
+                i += 1
+            else:
+                chunk = data[i:]
+                i = len(data)
+            if control & 0x40:
+                for byte in chunk:
+                    self.write_ram(byte)
+            else:
+                for byte in chunk:
+                    self.command_byte(byte)
+
+    def command_byte(self, byte):
+        self.pending.append(byte)
+        if len(self.pending) > self.PARAMS.get(self.pending[0], 0):
+            command = self.pending
+            self.pending = []
+            self.commands_received += 1
+            self.execute(command)
+
+    def execute(self, command):
+        op = command[0]
+        if op in self.PARAMS:
+            self.registers[op] = tuple(command[1:])
+        if op == 0x20:
+            self.memory_mode = command[1] & 0x03
+        elif op == 0x21:
+            self.col_start = command[1] & 0x7F
+            self.col_end = command[2] & 0x7F
+            self.col = self.col_start
+        elif op == 0x22:
+            self.page_start = command[1] & 0x07
+            self.page_end = command[2] & 0x07
+            self.page = self.page_start
+        elif op <= 0x0F:
+            self.col = (self.col & 0xF0) | op
+        elif op <= 0x1F:
+            self.col = (self.col & 0x0F) | ((op & 0x07) << 4)
+        elif op in (0x26, 0x27, 0x29, 0x2A):
+            self.scroll_setup = tuple(command)
+        elif op == 0x2E:
+            self.scroll_active = False
+        elif op == 0x2F:
+            self.scroll_active = True
+        elif 0x40 <= op <= 0x7F:
+            self.start_line = op & 0x3F
+        elif op == 0x81:
+            self.contrast = command[1]
+        elif op in (0xA0, 0xA1):
+            self.seg_remap = op & 0x01
+        elif op == 0xA3:
+            self.vert_scroll_area = (command[1], command[2])
+        elif op in (0xA4, 0xA5):
+            self.entire_on = op == 0xA5
+        elif op in (0xA6, 0xA7):
+            self.inverted = op == 0xA7
+        elif op == 0xA8:
+            self.multiplex = command[1] & 0x3F
+        elif op in (0xAE, 0xAF):
+            self.display_on = op == 0xAF
+        elif 0xB0 <= op <= 0xB7:
+            self.page = op & 0x07
+        elif op in (0xC0, 0xC8):
+            self.com_scan_dec = op == 0xC8
+        elif op == 0xD3:
+            self.display_offset = command[1] & 0x3F
+
+    # Stores a data byte at the ram pointer and advances it as the memory mode says
+    def write_ram(self, byte):
+        self.data_received += 1
+        self.ram[self.page * self.RAM_COLS + self.col] = byte
+        if self.memory_mode == 0x01:
+            # vertical: down the pages of the window, then the next column
+            if self.page >= self.page_end:
+                self.page = self.page_start
+                self.col = self.col_start if self.col >= self.col_end else self.col + 1
+            else:
+                self.page += 1
+        elif self.memory_mode == 0x00:
+            # horizontal: along the columns of the window, then the next page
+            if self.col >= self.col_end:
+                self.col = self.col_start
+                self.page = self.page_start if self.page >= self.page_end else self.page + 1
+            else:
+                self.col += 1
+        else:
+            # page addressing: along the page, wrapping to the window's first column
+            self.col = self.col_start if self.col >= self.col_end else self.col + 1
+
+    # The display ram in the layout of Bitmap.data: column after column, pages bytes
+    # per column (starting at page 0), for columns 0..cols-1
+    def ram_columns(self, pages=None, cols=None):
+        if pages is None:
+            pages = self.rows // 8
+        if cols is None:
+            cols = self.cols
+        columns = bytearray(cols * pages)
+        for col in range(0, cols):
+            for page in range(0, pages):
+                columns[col * pages + page] = self.ram[page * self.RAM_COLS + col]
+        return columns
+
+    def ram_pixel(self, col, row):
+        return (self.ram[(row // 8 % self.RAM_PAGES) * self.RAM_COLS + col] >> (row % 8)) & 1
+
+    # Pixel x,y as seen on the panel, in the orientation begin() sets up
+    # (segment remap on, COM scan decrementing)
+    def pixel(self, x, y):
+        if not self.display_on:
+            return 0
+        if self.entire_on:
+            return 1
+        col = x if self.seg_remap else self.cols - 1 - x
+        if not self.com_scan_dec:
+            y = self.multiplex - y
+        row = (self.start_line + self.display_offset + y) % 64
+        value = self.ram_pixel(col, row)
+        if self.inverted:
+            value ^= 1
+        return value
+
+    # What the panel shows, as rows of 0/1
+    def screen(self):
+        return [[self.pixel(x, y) for x in range(0, self.cols)] for y in range(0, self.rows)]
+
+    # Diagnostic print of what the panel shows to stdout
+    def dump(self):
+        for row in self.screen():
+            print('|' + ''.join(['*' if pixel else ' ' for pixel in row]) + '|')
+
+# Transport that sends the writes to emulated displays instead of a FF32.
+# A display is emulated for every I2C address and pin pair written to; add_panel()
+# sets up one with another size beforehand.
+#
+# transaction_time, byte_time: seconds every I2C write resp. byte takes, to simulate
+#                              the speed of a real bus (0: as fast as possible)
+# emulate:                     False to only count the writes (benchmarks of the driver)
+class EmulatedFF32(ff32bus.Transport):
+
+    def __init__(self, transaction_time=0, byte_time=0, emulate=True):
+        ff32bus.Transport.__init__(self)
+        self.transaction_time = transaction_time
+        self.byte_time = byte_time
+        self.emulate = emulate
+        self.connected = False
+        self.panels = {}
+        self.reset_counters()
+
+    def reset_counters(self):
+        self.transactions = 0
+        self.bytes_sent = 0
+        self.pin_writes = 0
+
+    def add_panel(self, slave_addr=0x3C, pins=(("A",5), ("A",6)), rows=64, cols=128):
+        panel = SSD1306Emulator(rows, cols)
+        self.panels[(slave_addr, pins)] = panel
+        return panel
+
+    # The emulated display at slave_addr on pins (default: the active pins)
+    def panel(self, slave_addr=0x3C, pins=None):
+        if pins is None:
+            pins = self.pins
+        if (slave_addr, pins) not in self.panels:
+            return self.add_panel(slave_addr, pins)
+        return self.panels[(slave_addr, pins)]
+
+    def is_open(self):
+        return self.connected
+
+    def _connect(self):
+        self.connected = True
+        self.opens += 1
+
+    def _disconnect(self):
+        self.connected = False
+
+    def _set_pins(self, scl_pin, sda_pin):
+        self.pin_writes += 1
+        if self.transaction_time:
+            time.sleep(self.transaction_time)
+
+    def _write(self, slave_addr, data):
+        if not self.connected:
+            raise IOError("FF32 not open")
+        self.transactions += 1
+        self.bytes_sent += len(data)
+        delay = self.transaction_time + self.byte_time * len(data)
+        if delay:
+            time.sleep(delay)
+        if self.emulate:
+            self.panel(slave_addr).write(data)
@@ -0,0 +1,223 @@
+#-----------------------------------------------------------------------------------------
+# ff32fonts.py
+# About:
+# Compact binary font files for ff32ssd1306. Font modules like arial_16 hold their
+# glyphs, descriptors and full N x N kerning table as literal lists, which are slow
+# to import on a RaspberryPi and keep every byte as a Python int. A font file is
+# memory mapped instead: nothing is decoded until a character is drawn, and the
+# kerning table is stored sparsely (per character its most common value plus the
+# exceptions).
+#
+# Usage:
+#   python ff32fonts.py arial_16 arial_16.ff32f     convert a font module
+#   python ff32fonts.py font5x8.Font5x8 font5x8.ff32f
+#
+#   font = ff32fonts.load("arial_16.ff32f")
+#   oled.draw_text3(0, 0, "21.5", font)     # same as with the arial_16 module
+#   oled = ff32ssd1306.SSD1306(font=ff32fonts.load("font5x8.ff32f"))  # draw_text/draw_text2
+#
+# Loaded fonts have the attributes of the font modules (char_height, start_char,
+# end_char, space_width, gap_width, descriptors, bitmaps, kerning; or rows, cols,
+# bytes for font5x8), so everything that takes a font takes them as well.
+#
+# File layout (little endian):
+#   header:      "FF32FONT", version, kind
+#   PROPORTIONAL char_height, space_width, gap_width, start_char, end_char,
+#                offsets of the descriptor, kerning and bitmap sections
+#                descriptors: per character width, offset into the bitmaps
+#                kerning:     per character default, nr of exceptions, their offset
+#                             followed by the exceptions (character, value)
+#   FIXED        rows, cols, nr of characters, offset of the column bytes
+#-----------------------------------------------------------------------------------------
+
+import collections
+import mmap
+import struct
+import sys
+
+MAGIC        = b"FF32FONT"
+VERSION      = 1
+PROPORTIONAL = 0    # like arial_16: rows of pixels, descriptors and kerning
+FIXED        = 1    # like font5x8: one byte per column, fixed size
+
+HEADER       = struct.Struct("<8sBB")
+PROP_HEADER  = struct.Struct("<HHHHHIII")
+FIXED_HEADER = struct.Struct("<HHHI")
+DESCRIPTOR   = struct.Struct("<HI")
+KERNING_ROW  = struct.Struct("<hHI")
+KERNING_PAIR = struct.Struct("<Hh")
+
+# Read only view of the bytes of a mapped file from base on, indexed like a list of ints
+class ByteView:
+
+    def __init__(self, buffer, base):
+        self.buffer = buffer
+        self.base = base
+
+    if sys.version_info[0] < 3:
+        def __getitem__(self, i):
+            return ord(self.buffer[self.base + i])
+    else:
+        def __getitem__(self, i):
+            return self.buffer[self.base + i]
+
+# font.descriptors: (width, offset) per character, decoded on first use
+class Descriptors:
+
+    def __init__(self, buffer, base, count):
+        self.buffer = buffer
+        self.base = base
+        self.decoded = [None] * count
+
+    def __len__(self):
+        return len(self.decoded)
+
+    def __getitem__(self, pos):
+        descriptor = self.decoded[pos]
+        if descriptor is None:
+            descriptor = DESCRIPTOR.unpack_from(self.buffer, self.base + pos * DESCRIPTOR.size)
+            self.decoded[pos] = descriptor
+        return descriptor
+
+# font.kerning[prev]: the kerning of character prev followed by each character
+class KerningRow:
+
+    def __init__(self, default, exceptions):
+        self.default = default
+        self.exceptions = exceptions
+
+    def __getitem__(self, pos):
+        return self.exceptions.get(pos, self.default)
+
+# font.kerning: rows decoded on first use
+class Kerning:
+
+    def __init__(self, buffer, base, count):
+        self.buffer = buffer
+        self.base = base
+        self.decoded = [None] * count
+
+    def __len__(self):
+        return len(self.decoded)
+
+    def __getitem__(self, prev):
+        row = self.decoded[prev]
+        if row is None:
+            (default, count, offset) = KERNING_ROW.unpack_from(self.buffer, self.base + prev * KERNING_ROW.size)
+            exceptions = {}
+            for i in range(0, count):
+                (pos, value) = KERNING_PAIR.unpack_from(self.buffer, offset + i * KERNING_PAIR.size)
+                exceptions[pos] = value
+            row = KerningRow(default, exceptions)
+            self.decoded[prev] = row
+        return row
+
+class ProportionalFont:
+
+    def __init__(self, buffer, name=None):
+        self.buffer = buffer
+        self.name = name
+        (self.char_height, self.space_width, self.gap_width, start, end,
+         descriptors, kerning, bitmaps) = PROP_HEADER.unpack_from(buffer, HEADER.size)
+        self.start_char = chr(start)
+        self.end_char = chr(end)
+        count = end - start + 1
+        self.descriptors = Descriptors(buffer, descriptors, count)
+        self.kerning = Kerning(buffer, kerning, count)
+        self.bitmaps = ByteView(buffer, bitmaps)
+
+    def close(self):
+        self.buffer.close()
+
+class FixedFont:
+
+    def __init__(self, buffer, name=None):
+        self.buffer = buffer
+        self.name = name
+        (self.rows, self.cols, self.count, data) = FIXED_HEADER.unpack_from(buffer, HEADER.size)
+        self.bytes = ByteView(buffer, data)
+
+    def close(self):
+        self.buffer.close()
+
+# Maps the font file at path and returns its font
+def load(path):
+    with open(path, "rb") as f:
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    (magic, version, kind) = HEADER.unpack_from(buffer, 0)
+    if magic != MAGIC or version != VERSION:
+        buffer.close()
+        raise ValueError("%s is not a version %d font file" % (path, VERSION))
+    if kind == PROPORTIONAL:
+        return ProportionalFont(buffer, path)
+    if kind == FIXED:
+        return FixedFont(buffer, path)
+    buffer.close()
+    raise ValueError("%s: unknown font kind %d" % (path, kind))
+
+# Returns the font file contents for font: a font module like arial_16, or a
+# class like font5x8.Font5x8
+def encode(font):
+    if hasattr(font, "descriptors"):
+        return encode_proportional(font)
+    if hasattr(font, "bytes"):
+        return encode_fixed(font)
+    raise ValueError("%r is not a font" % (font,))
+
+def encode_proportional(font):
+    count = ord(font.end_char) - ord(font.start_char) + 1
+    descriptors = HEADER.size + PROP_HEADER.size
+    kerning = descriptors + count * DESCRIPTOR.size
+    pairs = kerning + count * KERNING_ROW.size
+    rows = []
+    exceptions = bytearray()
+    for prev in range(0, count):
+        row = [font.kerning[prev][pos] for pos in range(0, count)]
+        default = collections.Counter(row).most_common(1)[0][0]
+        offset = pairs + len(exceptions)
+        n = 0
+        for (pos, value) in enumerate(row):
+            if value != default:
+                exceptions += KERNING_PAIR.pack(pos, value)
+                n += 1
+        rows.append(KERNING_ROW.pack(default, n, offset))
+    bitmaps = pairs + len(exceptions)
+    data = bytearray(HEADER.pack(MAGIC, VERSION, PROPORTIONAL))
+    data += PROP_HEADER.pack(font.char_height, font.space_width, font.gap_width,
+                             ord(font.start_char), ord(font.end_char),
+                             descriptors, kerning, bitmaps)
+    for pos in range(0, count):
+        data += DESCRIPTOR.pack(*font.descriptors[pos])
+    for row in rows:
+        data += row
+    data += exceptions
+    data += bytearray(font.bitmaps)
+    return bytes(data)
+
+def encode_fixed(font):
+    count = len(font.bytes) // font.cols
+    data = bytearray(HEADER.pack(MAGIC, VERSION, FIXED))
+    data += FIXED_HEADER.pack(font.rows, font.cols, count, HEADER.size + FIXED_HEADER.size)
+    data += bytearray(font.bytes)
+    return bytes(data)
+
+# Writes font (see encode) to a font file at path
+def convert(font, path):
+    with open(path, "wb") as f:
+        f.write(encode(font))
+
+def main():
+    import argparse
+    import importlib
+    parser = argparse.ArgumentParser(description="Converts a font module to a ff32fonts font file")
+    parser.add_argument("font", help="font module, or module.Class (e.g. font5x8.Font5x8)")
+    parser.add_argument("path", help="font file to write")
+    args = parser.parse_args()
+    (module, dot, name) = args.font.partition(".")
+    font = importlib.import_module(module)
+    if name:
+        font = getattr(font, name)
+    convert(font, args.path)
+
+if __name__ == "__main__":
+    main()
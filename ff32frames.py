@@ -0,0 +1,215 @@
+#-----------------------------------------------------------------------------------------
+# ff32frames.py
+# About:
+# Records successive Bitmap frames to a compact file and plays them back on a display,
+# for boot animations and for replaying diagnostic sessions.
+#
+# Usage:
+#   with ff32frames.Recorder("boot.ff32a", interval=0.04) as recorder:
+#       for i in range(0, 50):
+#           oled.clear_display()
+#           oled.fill_circle(64, 32, i)
+#           recorder.add(oled.bitmap)
+#
+#   player = ff32frames.Player("boot.ff32a")
+#   player.play(oled)              # loops=0 plays until interrupted
+#
+# The first frame is stored whole, later frames as the columns that changed per page.
+# Before playing, the player rebuilds every frame, combines the changed pages into
+# address windows (like SSD1306.display() does) and compiles the I2C messages for
+# them, so playback only writes prepared bytes, paced at a fixed frame interval.
+#
+# File layout (little endian):
+#   header: "FF32ANIM", version, cols, rows, frame interval in microseconds
+#   frames: nr of page records, then per record page, first and last column,
+#           followed by the page bytes of those columns
+#-----------------------------------------------------------------------------------------
+
+import struct
+import time
+
+MAGIC   = b"FF32ANIM"
+VERSION = 1
+
+HEADER  = struct.Struct("<8sBHHI")
+FRAME   = struct.Struct("<H")
+RECORD  = struct.Struct("<BHH")
+
+class Recorder:
+
+    # cols, rows: size of the frames (of the bitmaps passed to add())
+    # interval:   seconds between frames on playback
+    def __init__(self, path, cols=128, rows=64, interval=0.04):
+        self.cols = cols
+        self.rows = rows
+        self.bytes_per_col = rows // 8
+        self.previous = None
+        self.frames = 0
+        self.file = open(path, "wb")
+        self.file.write(HEADER.pack(MAGIC, VERSION, cols, rows, int(round(interval * 1000000))))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    # Adds the contents of bitmap (cols x rows) as the next frame
+    def add(self, bitmap):
+        if bitmap.cols != self.cols or bitmap.rows != self.rows:
+            raise ValueError("frames are %dx%d, not %dx%d" % (self.cols, self.rows, bitmap.cols, bitmap.rows))
+        data = bitmap.data
+        bpc = self.bytes_per_col
+        records = []
+        for page in range(0, bpc):
+            new = data[page::bpc]
+            if self.previous is None:
+                (lo, hi) = (0, self.cols - 1)
+            else:
+                old = self.previous[page::bpc]
+                if new == old:
+                    continue
+                lo = 0
+                while new[lo] == old[lo]:
+                    lo += 1
+                hi = self.cols - 1
+                while new[hi] == old[hi]:
+                    hi -= 1
+            records.append(RECORD.pack(page, lo, hi) + bytes(new[lo:hi + 1]))
+        self.file.write(FRAME.pack(len(records)) + b"".join(records))
+        self.previous = bytearray(data)
+        self.frames += 1
+
+    def close(self):
+        self.file.close()
+
+class Player:
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            data = f.read()
+        (magic, version, self.cols, self.rows, interval) = HEADER.unpack_from(data, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("%s is not a version %d frame file" % (path, VERSION))
+        self.interval = interval / 1000000.0
+        self.bytes_per_col = self.rows // 8
+        # per frame the list of (page, first column, last column, page bytes)
+        self.frames = []
+        i = HEADER.size
+        while i < len(data):
+            (count,) = FRAME.unpack_from(data, i)
+            i += FRAME.size
+            records = []
+            for n in range(0, count):
+                (page, lo, hi) = RECORD.unpack_from(data, i)
+                i += RECORD.size
+                records.append((page, lo, hi, data[i:i + hi - lo + 1]))
+                i += hi - lo + 1
+            self.frames.append(records)
+        self.plans = {}
+
+    # Compiles the I2C messages of every frame for display. Returns a list with
+    # per frame the messages to send, plus one more for going from the last frame
+    # back to the first when looping.
+    def prepare(self, display):
+        key = (display.__class__, display.cols, display.rows)
+        if key in self.plans:
+            return self.plans[key]
+        if self.cols > display.cols or self.rows > display.rows:
+            raise ValueError("frames of %dx%d do not fit the display" % (self.cols, self.rows))
+        bpc = self.bytes_per_col
+        frame = bytearray(self.cols * bpc)
+        plans = []
+        for records in self.frames:
+            ranges = [None] * bpc
+            for (page, lo, hi, page_bytes) in records:
+                frame[lo * bpc + page:(hi + 1) * bpc:bpc] = page_bytes
+                ranges[page] = (lo, hi)
+            plans.append(self.plan(display, frame, ranges))
+        # loop: from the last frame back to the first
+        if self.frames:
+            first = bytearray(self.cols * bpc)
+            for (page, lo, hi, page_bytes) in self.frames[0]:
+                first[lo * bpc + page:(hi + 1) * bpc:bpc] = page_bytes
+            ranges = [None] * bpc
+            for page in range(0, bpc):
+                new = first[page::bpc]
+                old = frame[page::bpc]
+                if new != old:
+                    lo = 0
+                    while new[lo] == old[lo]:
+                        lo += 1
+                    hi = self.cols - 1
+                    while new[hi] == old[hi]:
+                        hi -= 1
+                    ranges[page] = (lo, hi)
+            plans.append(self.plan(display, first, ranges))
+        self.plans[key] = plans
+        return plans
+
+    # The messages that send the changed column ranges (per page, None if unchanged)
+    # of frame, with adjacent pages merged into one window when that is cheaper
+    def plan(self, display, frame, ranges):
+        windows = []
+        current = None
+        for (page, columns) in enumerate(ranges):
+            if columns is None:
+                continue
+            (lo, hi) = columns
+            if current is not None and current[1] == page - 1:
+                (page_start, page_end, col_start, col_end) = current
+                merged = (page_start, page, min(col_start, lo), max(col_end, hi))
+                merged_cost = display.transfer_cost((page - page_start + 1) * (merged[3] - merged[2] + 1))
+                split_cost = (display.transfer_cost((page_end - page_start + 1) * (col_end - col_start + 1)) +
+                              display.transfer_cost(hi - lo + 1))
+                if merged_cost <= split_cost:
+                    current = merged
+                    continue
+            if current is not None:
+                windows.append(current)
+            current = (page, page, lo, hi)
+        if current is not None:
+            windows.append(current)
+        bpc = self.bytes_per_col
+        messages = []
+        for (page_start, page_end, col_start, col_end) in windows:
+            messages += display.compile_commands((display.SET_MEMORY_MODE, display.MEMORY_MODE_VERT),
+                                                 (display.SET_PAGE_ADDRESS, page_start, page_end),
+                                                 (display.SET_COL_ADDRESS, col_start, col_end))
+            databytes = bytearray()
+            for col in range(col_start, col_end + 1):
+                databytes += frame[col * bpc + page_start:col * bpc + page_end + 1]
+            for i in range(0, len(databytes), display.DATA_CHUNK):
+                messages.append(bytearray([display.DATA_MODE]) + databytes[i:i + display.DATA_CHUNK])
+        return messages
+
+    # Plays the frames on display (a SSD1306) loops times (0: forever), one frame
+    # every interval seconds (default: as recorded). Frames are never dropped: when
+    # sending falls behind, the next frame follows at once.
+    def play(self, display, loops=1, interval=None):
+        if interval is None:
+            interval = self.interval
+        plans = self.prepare(display)
+        if not self.frames:
+            return
+        display.wait_idle()
+        display.command(display.SET_START_LINE | 0x00)
+        next_frame = time.time()
+        loop = 0
+        try:
+            while loops == 0 or loop < loops:
+                for (i, messages) in enumerate(plans[:-1]):
+                    if i == 0 and loop > 0:
+                        messages = plans[-1]
+                    with display.session.lock:
+                        display.send_commands(messages)
+                    next_frame += interval
+                    delay = next_frame - time.time()
+                    if delay > 0:
+                        time.sleep(delay)
+                    else:
+                        next_frame = time.time()
+                loop += 1
+        finally:
+            # the display ram now holds the animation, not the display's bitmap
+            display.invalidate()
@@ -0,0 +1,143 @@
+#-----------------------------------------------------------------------------------------
+# ff32glyphs.py
+# About:
+# Cache of glyphs pre-rendered in the column-major page format of the SSD1306 buffer.
+# A glyph is converted once per font, character and vertical bit offset (y % 8);
+# drawing text then comes down to merging whole bytes into the Bitmap.
+#
+# A glyph is a tuple (width, pages, data, masks):
+#   width: nr of columns
+#   pages: nr of page bytes per column
+#   data:  bytearray of width * pages bytes, column after column
+#   masks: None for transparent glyphs (data is OR-ed into the bitmap), or a bytearray
+#          like data with the bits the glyph overwrites (opaque glyphs, e.g. font5x8)
+#
+# The cache is bounded to max_bytes of glyph data; the least recently used glyphs
+# are evicted first.
+#
+# Scaled glyphs (every pixel drawn as size x size pixels) are rendered with bit
+# expansion tables: a column byte is looked up once instead of setting each bit.
+#-----------------------------------------------------------------------------------------
+
+import collections
+import threading
+
+class GlyphCache:
+
+    MAX_BYTES      = 65536   # Default bound on the cached glyph data
+    GLYPH_OVERHEAD = 64      # Bytes accounted per glyph on top of its data
+
+    def __init__(self, max_bytes=MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.glyphs = collections.OrderedDict()
+        self.lock = threading.Lock()
+
+    # Returns the glyph render(font, code, shift, *args), rendering it only when
+    # it is not in the cache yet
+    def get(self, render, font, code, shift, *args):
+        key = (render, font, code, shift) + args
+        with self.lock:
+            glyph = self.glyphs.pop(key, None)
+            if glyph is not None:
+                self.hits += 1
+                self.glyphs[key] = glyph
+                return glyph
+            self.misses += 1
+        glyph = render(font, code, shift, *args)
+        with self.lock:
+            if key not in self.glyphs:
+                self.glyphs[key] = glyph
+                self.size += self.glyph_size(glyph)
+            while self.size > self.max_bytes and len(self.glyphs) > 1:
+                (old_key, old_glyph) = self.glyphs.popitem(last=False)
+                self.size -= self.glyph_size(old_glyph)
+        return glyph
+
+    def glyph_size(self, glyph):
+        (width, pages, data, masks) = glyph
+        size = self.GLYPH_OVERHEAD + len(data)
+        if masks is not None:
+            size += len(masks)
+        return size
+
+    def clear(self):
+        with self.lock:
+            self.glyphs.clear()
+            self.size = 0
+
+# Per size a table of 256 entries: byte value to the integer with each of its bits
+# repeated size times
+expansion_tables = {}
+
+def expansion_table(size):
+    table = expansion_tables.get(size)
+    if table is None:
+        ones = (1 << size) - 1
+        table = [0] * 256
+        for value in range(1, 256):
+            # the lowest bit expanded, plus the table entry of the other bits
+            table[value] = (ones if value & 1 else 0) | (table[value >> 1] << size)
+        expansion_tables[size] = table
+    return table
+
+# Scales the column bits (bit n for row n) by size vertically, a byte at a time
+def scale_bits(bits, size):
+    table = expansion_table(size)
+    scaled = 0
+    shift = 0
+    while bits:
+        scaled |= table[bits & 0xFF] << shift
+        bits >>= 8
+        shift += 8 * size
+    return scaled
+
+# Splits the columns (integers with bit n for row n of the glyph) into page bytes,
+# shifted down by shift rows
+def pack_columns(columns, height, shift):
+    pages = (shift + height + 7) // 8
+    data = bytearray(len(columns) * pages)
+    i = 0
+    for bits in columns:
+        bits <<= shift
+        for page in range(0, pages):
+            data[i] = (bits >> (8 * page)) & 0xFF
+            i += 1
+    return (pages, data)
+
+# Glyph of a proportional font (like arial_16): font.bitmaps holds the rows of each
+# character MSB first, (width + 7) / 8 bytes per row. Each pixel is scaled to
+# size x size pixels. Transparent.
+def render_proportional(font, pos, shift, size=1):
+    (width, offset) = font.descriptors[pos]
+    height = font.char_height
+    bytes_per_row = (width + 7) // 8
+    columns = [0] * width
+    for row in range(0, height):
+        for col in range(0, width):
+            if font.bitmaps[offset + (col >> 3)] & (0x80 >> (col & 7)):
+                columns[col] |= 1 << row
+        offset += bytes_per_row
+    if size > 1:
+        scaled = []
+        for bits in columns:
+            scaled += [scale_bits(bits, size)] * size
+        columns = scaled
+    (pages, data) = pack_columns(columns, height * size, shift)
+    return (width * size, pages, data, None)
+
+# Glyph of font5x8 (font.bytes holds one byte per column, bit 0 at the top),
+# each pixel scaled to size x size pixels. Opaque: unset pixels are drawn black.
+def render_font5x8(font, code, shift, size=1):
+    height = font.rows * size
+    table = expansion_table(size)
+    columns = []
+    p = code * font.cols
+    for col in range(0, font.cols):
+        columns += [table[font.bytes[p]]] * size
+        p += 1
+    (pages, data) = pack_columns(columns, height, shift)
+    (pages, masks) = pack_columns([(1 << height) - 1] * len(columns), height, shift)
+    return (len(columns), pages, data, masks)
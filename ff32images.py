@@ -0,0 +1,177 @@
+#-----------------------------------------------------------------------------------------
+# ff32images.py
+# About:
+# Converts images to the column-major page layout of SSD1306.Bitmap, to show logos,
+# sparklines and pre-rendered charts. Takes PBM files (P1 and P4), NumPy 2-D arrays
+# and PIL images. White (or True, or >= threshold) pixels are lit; use invert=True for
+# black on white artwork.
+#
+# Usage:
+#   oled.draw_image("logo.pbm", 0, 0)              # converted once, then cached
+#   oled.draw_image(samples_array, 0, 40, threshold=1)
+#   oled.draw_image(pil_image, 64, 0, dither=True)
+#
+#   logo = ff32images.load("logo.pbm", oled.Bitmap)
+#   oled.display_block(logo.bitmap, 0, 0, logo.width)
+#
+# Grayscale arrays and images are thresholded, or dithered with a 4x4 ordered
+# (Bayer) matrix, and packed into page bytes as whole array operations. This needs
+# NumPy; PBM files are also read without it. Converted images are kept in a cache,
+# so drawing the same file, array or PIL image again is only a buffer copy. Arrays
+# are cached by identity: after changing an array in place, call cache.clear().
+#-----------------------------------------------------------------------------------------
+
+import collections
+import os
+import threading
+import weakref
+
+try:
+    import numpy
+except ImportError:
+    numpy = None    # only needed for arrays and PIL images
+
+# 4x4 Bayer matrix, thresholds for gray values 0..255
+BAYER_4X4 = [[0, 8, 2, 10], [12, 4, 14, 6], [3, 11, 1, 9], [15, 7, 13, 5]]
+
+# An image converted to a Bitmap. The bitmap has rows rounded up to a multiple of 8
+# (for display_block); width and height are the size of the image itself.
+class Image:
+
+    def __init__(self, bitmap, width, height):
+        self.bitmap = bitmap
+        self.width = width
+        self.height = height
+
+# Reads a PBM file (P1 or P4). Returns the pixels, True for white, as a NumPy bool
+# array (or a list of rows of 0/1 without NumPy).
+def read_pbm(path):
+    with open(path, "rb") as f:
+        data = f.read()
+    tokens = []
+    i = 0
+    # header: magic, width, height, separated by whitespace and # comments
+    while len(tokens) < 3:
+        while data[i:i + 1].isspace():
+            i += 1
+        if data[i:i + 1] == b"#":
+            while data[i:i + 1] not in (b"\n", b""):
+                i += 1
+            continue
+        start = i
+        while i < len(data) and not data[i:i + 1].isspace() and data[i:i + 1] != b"#":
+            i += 1
+        tokens.append(data[start:i])
+    (magic, width, height) = (tokens[0], int(tokens[1]), int(tokens[2]))
+    if magic == b"P4":
+        raster = bytearray(data[i + 1:])
+        row_bytes = (width + 7) // 8
+        if numpy is not None:
+            rows = numpy.frombuffer(bytes(raster[:row_bytes * height]), dtype=numpy.uint8).reshape(height, row_bytes)
+            return numpy.unpackbits(rows, axis=1)[:, :width] == 0
+        return [[not (raster[y * row_bytes + (x >> 3)] & (0x80 >> (x & 7))) for x in range(0, width)]
+                for y in range(0, height)]
+    if magic == b"P1":
+        bits = [c == b"0" for c in (data[j:j + 1] for j in range(i, len(data))) if c in (b"0", b"1")]
+        rows = [bits[y * width:(y + 1) * width] for y in range(0, height)]
+        if numpy is not None:
+            return numpy.array(rows, dtype=bool).reshape(height, width)
+        return rows
+    raise ValueError("%s is not a PBM file" % path)
+
+# The lit pixels of source (a PBM path, NumPy 2-D array or PIL image) as a bool array
+def pixels(source, threshold=128, dither=False):
+    if isinstance(source, (str, type(u""))):
+        return read_pbm(source)
+    if numpy is None:
+        raise ImportError("numpy is needed to convert arrays and PIL images")
+    if hasattr(source, "mode") and hasattr(source, "convert"):
+        # PIL image
+        if source.mode == "1":
+            return numpy.array(source, dtype=bool)
+        source = numpy.array(source.convert("L"))
+    array = numpy.asarray(source)
+    if array.ndim != 2:
+        raise ValueError("image arrays must be 2-D (rows, cols), not %d-D" % array.ndim)
+    if array.dtype == bool:
+        return array
+    if dither:
+        (height, width) = array.shape
+        matrix = (numpy.array(BAYER_4X4) + 0.5) * 16
+        tiled = numpy.tile(matrix, ((height + 3) // 4, (width + 3) // 4))[:height, :width]
+        return array > tiled
+    return array >= threshold
+
+# Packs the pixels (rows, cols) into a new bitmap_class(cols, rows rounded up to 8)
+def pack(lit, bitmap_class):
+    if numpy is not None and isinstance(lit, numpy.ndarray):
+        # imported here: ff32numpy imports ff32ssd1306, which imports this module
+        import ff32numpy
+        (height, width) = lit.shape
+        bitmap = bitmap_class(width, (height + 7) // 8 * 8)
+        bits = numpy.zeros((width, bitmap.rows), dtype=numpy.uint8)
+        bits[:, :height] = lit.T
+        bitmap.data[:] = ff32numpy.pack_columns(bits).tobytes()
+        return Image(bitmap, width, height)
+    height = len(lit)
+    width = len(lit[0]) if height else 0
+    bitmap = bitmap_class(width, (height + 7) // 8 * 8)
+    bpc = bitmap.bytes_per_col
+    for (y, row) in enumerate(lit):
+        for (x, on) in enumerate(row):
+            if on:
+                bitmap.data[x * bpc + y // 8] |= 1 << (y % 8)
+    return Image(bitmap, width, height)
+
+# Converts source (PBM path, NumPy array or PIL image) to an Image of bitmap_class
+def load(source, bitmap_class, threshold=128, dither=False, invert=False):
+    lit = pixels(source, threshold, dither)
+    if invert:
+        if numpy is not None and isinstance(lit, numpy.ndarray):
+            lit = ~lit
+        else:
+            lit = [[not on for on in row] for row in lit]
+    return pack(lit, bitmap_class)
+
+# Converted images by source and conversion options, least recently used first.
+# Files are recognized by path and modification time, other sources by identity
+# (as long as they are alive).
+class ImageCache:
+
+    MAX_IMAGES = 32
+
+    def __init__(self, max_images=MAX_IMAGES):
+        self.max_images = max_images
+        self.images = collections.OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, source, bitmap_class, threshold=128, dither=False, invert=False):
+        if isinstance(source, Image):
+            return source
+        options = (bitmap_class, threshold, dither, invert)
+        if isinstance(source, (str, type(u""))):
+            key = (os.path.abspath(source), os.path.getmtime(source)) + options
+            ref = None
+        else:
+            try:
+                ref = weakref.ref(source)
+            except TypeError:
+                return load(source, bitmap_class, threshold, dither, invert)
+            key = (id(source),) + options
+        with self.lock:
+            entry = self.images.pop(key, None)
+            if entry is not None and (ref is None or entry[0]() is source):
+                self.images[key] = entry
+                return entry[1]
+        image = load(source, bitmap_class, threshold, dither, invert)
+        with self.lock:
+            self.images[key] = (ref, image)
+            while len(self.images) > self.max_images:
+                self.images.popitem(last=False)
+        return image
+
+    def clear(self):
+        with self.lock:
+            self.images.clear()
+
+cache = ImageCache()
@@ -0,0 +1,200 @@
+#-----------------------------------------------------------------------------------------
+# ff32metrics.py
+# About:
+# Instrumentation of a ff32ssd1306.SSD1306: counts commands, data bytes, I2C transactions
+# and FF32 session opens, times display()/display_block() and the drawing calls with
+# rolling percentiles, and calls optional callbacks when a frame starts and ends.
+#
+# Usage:
+#   metrics = oled.enable_metrics(on_frame_end=export)
+#   ...
+#   metrics.snapshot()      # {"counters": {...}, "timers": {"display": {...}, ...}}
+#   oled.disable_metrics()
+#
+#   def export(display, frame):
+#       # frame: {"frame": 12, "seconds": 0.0031, "transactions": 3, "commands": 3,
+#       #         "data_bytes": 24, "bytes": 37, "opens": 0, "ok": True}
+#       ...
+#
+# Enabling wraps the methods of that one SSD1306 object; the class is not touched,
+# so a display without metrics runs exactly the same code as before.
+# A frame is one send_frame(): a display() without writer thread, or a frame sent
+# by the writer thread (the callbacks then run on that thread). Commands are counted
+# as sent with command() and commands(); begin() replays its init sequence as
+# precompiled messages, which count as transactions and bytes only.
+#-----------------------------------------------------------------------------------------
+
+import collections
+import threading
+import time
+
+try:
+    clock = time.perf_counter
+except AttributeError:
+    clock = time.time   # Python 2
+
+# Durations of the last window calls, for percentiles over recent behaviour
+class RollingTimer:
+
+    WINDOW = 256
+
+    def __init__(self, window=WINDOW):
+        self.samples = collections.deque(maxlen=window)
+        self.count = 0
+        self.total = 0.0
+
+    def record(self, seconds):
+        self.samples.append(seconds)
+        self.count += 1
+        self.total += seconds
+
+    # The p-th percentile (0..100) of the samples in the window, in seconds
+    def percentile(self, p):
+        samples = sorted(self.samples)
+        if not samples:
+            return 0.0
+        index = int(round(p / 100.0 * (len(samples) - 1)))
+        return samples[min(max(index, 0), len(samples) - 1)]
+
+    def summary(self):
+        samples = list(self.samples)
+        return {"count": self.count,
+                "mean": self.total / self.count if self.count else 0.0,
+                "p50": self.percentile(50),
+                "p90": self.percentile(90),
+                "p99": self.percentile(99),
+                "max": max(samples) if samples else 0.0}
+
+class Metrics:
+
+    # SSD1306 methods timed under their own name
+    TIMED_CALLS = ["display", "display_block", "draw_pixel", "draw_text", "draw_text2",
+                   "draw_text3", "clear_block", "fill_block", "invert_block", "blit", "draw_image",
+                   "hline", "vline", "rect", "fill_rect", "line", "circle", "fill_circle"]
+
+    COUNTERS = ["frames", "commands", "data_bytes", "transactions", "bytes", "opens"]
+
+    # on_frame_start(display), on_frame_end(display, frame): see the module header
+    def __init__(self, on_frame_start=None, on_frame_end=None, window=RollingTimer.WINDOW):
+        self.on_frame_start = on_frame_start
+        self.on_frame_end = on_frame_end
+        self.window = window
+        self.lock = threading.Lock()
+        self.display = None
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.counters = dict((name, 0) for name in self.COUNTERS)
+            self.timers = {}
+            if self.display is not None:
+                self.opens_base = self.display.session.opens
+
+    def timer(self, name):
+        with self.lock:
+            if name not in self.timers:
+                self.timers[name] = RollingTimer(self.window)
+            return self.timers[name]
+
+    def count(self, **amounts):
+        with self.lock:
+            for (name, amount) in amounts.items():
+                self.counters[name] += amount
+
+    def snapshot(self):
+        with self.lock:
+            counters = dict(self.counters)
+            if self.display is not None:
+                counters["opens"] = self.display.session.opens - self.opens_base
+            timers = dict((name, timer.summary()) for (name, timer) in self.timers.items())
+        return {"counters": counters, "timers": timers}
+
+    # Installs the wrappers on display (a SSD1306)
+    def attach(self, display):
+        self.display = display
+        self.opens_base = display.session.opens
+        for name in self.TIMED_CALLS:
+            self.wrap(name, self.timed(name, getattr(display, name)))
+        self.wrap("command", self.counted_command(display.command))
+        self.wrap("commands", self.counted_commands(display.commands))
+        self.wrap("send_commands", self.counted_messages(display.send_commands))
+        self.wrap("data", self.counted_data(display.data, display.DATA_CHUNK))
+        self.wrap("send_frame", self.frame(display.send_frame))
+
+    def detach(self):
+        display = self.display
+        for name in self.TIMED_CALLS + ["command", "commands", "send_commands", "data", "send_frame"]:
+            if name in display.__dict__:
+                delattr(display, name)
+        self.display = None
+
+    def wrap(self, name, func):
+        setattr(self.display, name, func)
+
+    def timed(self, name, func):
+        timer = self.timer(name)
+        def call(*args, **kwargs):
+            start = clock()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                seconds = clock() - start
+                with self.lock:
+                    timer.record(seconds)
+        return call
+
+    def counted_command(self, func):
+        def command(*commandbytes):
+            self.count(commands=len(self.display.split_commands(commandbytes)))
+            return func(*commandbytes)
+        return command
+
+    def counted_commands(self, func):
+        def commands(*commands):
+            self.count(commands=len(commands))
+            return func(*commands)
+        return commands
+
+    def counted_messages(self, func):
+        def send_commands(messages):
+            self.count(transactions=len(messages), bytes=sum([len(message) for message in messages]))
+            return func(messages)
+        return send_commands
+
+    def counted_data(self, func, chunk):
+        def data(databytes):
+            nbytes = len(databytes)
+            transactions = (nbytes + chunk - 1) // chunk
+            self.count(data_bytes=nbytes, transactions=transactions, bytes=nbytes + transactions)
+            return func(databytes)
+        return data
+
+    # Times a send_frame() and reports what it sent to the frame callbacks
+    def frame(self, func):
+        timer = self.timer("frame")
+        def send_frame(bitmap, col_offset):
+            display = self.display
+            if self.on_frame_start is not None:
+                self.on_frame_start(display)
+            with self.lock:
+                before = dict(self.counters)
+            opens = display.session.opens
+            start = clock()
+            ok = False
+            try:
+                func(bitmap, col_offset)
+                ok = True
+            finally:
+                seconds = clock() - start
+                with self.lock:
+                    timer.record(seconds)
+                    self.counters["frames"] += 1
+                    frame = dict((name, self.counters[name] - before[name])
+                                 for name in ("commands", "data_bytes", "transactions", "bytes"))
+                    frame["frame"] = self.counters["frames"]
+                frame["seconds"] = seconds
+                frame["opens"] = display.session.opens - opens
+                frame["ok"] = ok
+                if self.on_frame_end is not None:
+                    self.on_frame_end(display, frame)
+        return send_frame
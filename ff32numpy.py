@@ -0,0 +1,187 @@
+#-----------------------------------------------------------------------------------------
+# ff32numpy.py
+# About:
+# Optional NumPy based implementation of ff32ssd1306.SSD1306.Bitmap.
+# Block clears, fills, inversions, blits, lines and circles are done as vectorized
+# operations on the column-major page layout instead of Python loops over bytes,
+# pixels or spans.
+# The result is byte for byte identical to the pure Python Bitmap.
+#
+# Usage:
+#   import ff32numpy
+#   oled = ff32ssd1306.SSD1306(bitmap_class=ff32numpy.NumpyBitmap)
+#
+# The NumPy array is a view on Bitmap.data (a bytearray), so all other Bitmap
+# methods and the transfer code in SSD1306 work unchanged.
+#-----------------------------------------------------------------------------------------
+
+import numpy
+import ff32ssd1306
+
+# Unpacks page bytes (n, pages) into pixels (n, pages*8), one row per column,
+# with the rows in display order (bit 0 of a page byte is its top row).
+def unpack_columns(columns):
+    bits = numpy.unpackbits(columns[:, :, numpy.newaxis], axis=2)[:, :, ::-1]
+    return bits.reshape(columns.shape[0], -1)
+
+# Inverse of unpack_columns
+def pack_columns(bits):
+    bits = bits.reshape(bits.shape[0], -1, 8)[:, :, ::-1]
+    return numpy.packbits(bits, axis=2).reshape(bits.shape[0], -1)
+
+# Returns the (cols, pages) array view on the data of any Bitmap
+def as_array(bitmap):
+    array = getattr(bitmap, 'array', None)
+    if array is None:
+        array = numpy.frombuffer(bitmap.data, dtype=numpy.uint8).reshape(bitmap.cols, bitmap.bytes_per_col)
+    return array
+
+class NumpyBitmap(ff32ssd1306.SSD1306.Bitmap):
+
+    def __init__(self, cols, rows):
+        ff32ssd1306.SSD1306.Bitmap.__init__(self, cols, rows)
+        # view on self.data: one row of page bytes per display column
+        self.array = numpy.frombuffer(self.data, dtype=numpy.uint8).reshape(self.cols, self.bytes_per_col)
+
+    def clear(self):
+        self.array.fill(0)
+        self.mark_dirty(0, 0, self.cols, self.rows)
+
+    # The page masks of rows y0..y1 as a vector to broadcast over columns
+    def mask_vector(self, y0, y1):
+        mask = numpy.zeros(self.bytes_per_col, dtype=numpy.uint8)
+        for (page, page_mask) in self.page_masks(y0, y1):
+            mask[page] = page_mask
+        return mask
+
+    def block_op(self, x0, y0, dx, dy, op):
+        block = self.clip_block(x0, y0, dx, dy)
+        if block is None:
+            return
+        (x0, y0, x1, y1) = block
+        columns = self.array[x0:x1 + 1]
+        mask = self.mask_vector(y0, y1)
+        if op == self.BLOCK_CLEAR:
+            columns &= ~mask
+        elif op == self.BLOCK_FILL:
+            columns |= mask
+        else:
+            columns ^= mask
+        self.mark_dirty(x0, y0, x1 - x0 + 1, y1 - y0 + 1)
+
+    def blit(self, src, x=0, y=0, cols=None, rows=None):
+        block = self.clip_block(x, y, src.cols if cols is None else min(cols, src.cols),
+                                 src.rows if rows is None else min(rows, src.rows))
+        if block is None:
+            return
+        (x0, y0, x1, y1) = block
+        if y0 % 8 == 0 and (y1 + 1) % 8 == 0 and (y0 - y) % 8 == 0:
+            # page aligned: plain byte copy
+            self.array[x0:x1 + 1, y0 // 8:(y1 + 1) // 8] = as_array(src)[x0 - x:x1 - x + 1, (y0 - y) // 8:(y1 + 1 - y) // 8]
+        else:
+            src_bits = unpack_columns(as_array(src)[x0 - x:x1 - x + 1])
+            bits = unpack_columns(self.array[x0:x1 + 1])
+            bits[:, y0:y1 + 1] = src_bits[:, y0 - y:y1 - y + 1]
+            self.array[x0:x1 + 1] = pack_columns(bits)
+        self.mark_dirty(x0, y0, x1 - x0 + 1, y1 - y0 + 1)
+
+    # Applies op to the pixels xs, ys (arrays, no pixel twice) in one operation
+    def pixels_op(self, xs, ys, op):
+        inside = (xs >= 0) & (xs < self.cols) & (ys >= 0) & (ys < self.rows)
+        (xs, ys) = (xs[inside], ys[inside])
+        if len(xs) == 0:
+            return
+        index = xs * self.bytes_per_col + ys // 8
+        (first, last) = (index.min(), index.max())
+        # the pixels of a byte are different bits, so their sum is the byte mask
+        masks = numpy.bincount(index - first, weights=1 << (ys % 8)).astype(numpy.uint8)
+        data = self.array.reshape(-1)[first:last + 1]
+        if op == self.BLOCK_CLEAR:
+            data &= ~masks
+        elif op == self.BLOCK_FILL:
+            data |= masks
+        else:
+            data ^= masks
+        (x0, y0) = (int(xs.min()), int(ys.min()))
+        self.mark_dirty(x0, y0, int(xs.max()) - x0 + 1, int(ys.max()) - y0 + 1)
+
+    # Applies op to the vertical spans of rows tops..bottoms in columns xs (arrays,
+    # no column twice) in one operation
+    def spans_op(self, xs, tops, bottoms, op):
+        tops = numpy.maximum(tops, 0)
+        bottoms = numpy.minimum(bottoms, self.rows - 1)
+        inside = (xs >= 0) & (xs < self.cols) & (tops <= bottoms)
+        (xs, tops, bottoms) = (xs[inside], tops[inside], bottoms[inside])
+        if len(xs) == 0:
+            return
+        # per column and page the bits from the top to the bottom row in that page
+        page_rows = numpy.arange(self.bytes_per_col) * 8
+        top = numpy.clip(tops[:, numpy.newaxis] - page_rows, 0, 8)
+        end = numpy.clip(bottoms[:, numpy.newaxis] - page_rows + 1, 0, 8)
+        masks = ((0xFF << top) & ((1 << end) - 1)).astype(numpy.uint8)
+        if op == self.BLOCK_CLEAR:
+            self.array[xs] &= ~masks
+        elif op == self.BLOCK_FILL:
+            self.array[xs] |= masks
+        else:
+            self.array[xs] ^= masks
+        (x0, y0) = (int(xs.min()), int(tops.min()))
+        self.mark_dirty(x0, y0, int(xs.max()) - x0 + 1, int(bottoms.max()) - y0 + 1)
+
+    # Same pixels as Bitmap.line: the Bresenham y of the k-th x is computed for
+    # all x at once (y steps whenever the error dx // 2 - k * dy drops below 0)
+    def line(self, x0, y0, x1, y1, op=ff32ssd1306.SSD1306.Bitmap.BLOCK_FILL):
+        steep = abs(y1 - y0) > abs(x1 - x0)
+        if steep:
+            (x0, y0, x1, y1) = (y0, x0, y1, x1)
+        if x0 > x1:
+            (x0, y0, x1, y1) = (x1, y1, x0, y0)
+        dx = x1 - x0
+        dy = abs(y1 - y0)
+        ystep = 1 if y0 < y1 else -1
+        k = numpy.arange(dx + 1)
+        if dx > 0:
+            steps = numpy.maximum(-((dx // 2 - k * dy) // dx), 0)
+        else:
+            steps = k
+        (xs, ys) = (x0 + k, y0 + ystep * steps)
+        if steep:
+            (xs, ys) = (ys, xs)
+        self.pixels_op(xs, ys, op)
+
+    # The points of the midpoint circle (as Bitmap.circle_columns) as arrays xs, ys
+    def circle_points(self, x0, y0, r):
+        octant = []
+        x = 0
+        y = r
+        f = 1 - r
+        while x <= y:
+            octant.append((x, y))
+            if f >= 0:
+                y -= 1
+                f -= 2 * y
+            x += 1
+            f += 2 * x + 1
+        (px, py) = numpy.array(octant).T
+        (px, py) = (numpy.concatenate((px, py)), numpy.concatenate((py, px)))
+        xs = numpy.concatenate((px, -px, px, -px))
+        ys = numpy.concatenate((py, py, -py, -py))
+        # without the points the octants share
+        size = 2 * r + 1
+        points = numpy.unique((xs + r) * size + ys + r)
+        return (points // size - r + x0, points % size - r + y0)
+
+    def circle(self, x0, y0, r, op=ff32ssd1306.SSD1306.Bitmap.BLOCK_FILL):
+        if r < 0:
+            return
+        (xs, ys) = self.circle_points(x0, y0, r)
+        self.pixels_op(xs, ys, op)
+
+    def fill_circle(self, x0, y0, r, op=ff32ssd1306.SSD1306.Bitmap.BLOCK_FILL):
+        if r < 0:
+            return
+        (xs, ys) = self.circle_points(x0, y0, r)
+        # points are sorted by column: the first and last of a column are its ends
+        (columns, first) = numpy.unique(xs, return_index=True)
+        last = numpy.append(first[1:], len(xs)) - 1
+        self.spans_op(columns, ys[first], ys[last], op)
@@ -47,10 +47,13 @@
 #
 #----------------------------------------------------------------------------------------------
 
-import pyff32
-import font5x8
+import collections
+import ff32bus
+import ff32glyphs
+import ff32metrics
 import time
 import sys
+import threading
 
 class SSD1306:
 
@@ -58,6 +61,8 @@ class SSD1306:
     # or my_instance.CONST
     
     MAX_FF32_MSG          = 60      # Max nr of bytes allowed to send to FF32 (I2C address excluded) in one message
+    DATA_CHUNK            = MAX_FF32_MSG - 2  # Nr of display bytes data() sends per I2C transaction
+    WINDOW_OVERHEAD       = 1       # Nr of I2C transactions to set up an address window in display_block
     
     COMMAND_MODE          = 0x00    # Continuation=0, Command/Data=0
     DATA_MODE             = 0x40    # Continuation=0, Command/Data=1
@@ -100,117 +105,586 @@ class SSD1306:
     MEMORY_MODE_VERT      = 0x01
     MEMORY_MODE_PAGE      = 0x02
 
+    SCROLL_RIGHT          = 1
+    SCROLL_LEFT           = -1
+    # Hardware scroll step interval (in frames) to its command parameter
+    SCROLL_INTERVALS      = {2: 0x07, 3: 0x04, 4: 0x05, 5: 0x00, 25: 0x06, 64: 0x01, 128: 0x02, 256: 0x03}
 
-    def __init__(self, slave_addr=0x3C, scl_pin=("A",5), sda_pin=("A",6), buffer_rows=64, buffer_cols=128, rows=64, cols=128):
+    # Operations of the drawing primitives (line, rect, circle, ...): the same as
+    # Bitmap.BLOCK_CLEAR/BLOCK_FILL/BLOCK_INVERT. BLOCK_INVERT draws in XOR mode.
+    BLOCK_CLEAR           = 0
+    BLOCK_FILL            = 1
+    BLOCK_INVERT          = 2
+
+    # Controller registers kept in the register model (see update_registers),
+    # by the command byte that sets them
+    REGISTERS = {SET_MEMORY_MODE:  "memory_mode",
+                 SET_PAGE_ADDRESS: "page_window",
+                 SET_COL_ADDRESS:  "col_window",
+                 SET_CONTRAST:     "contrast",
+                 NORMAL_DISPLAY:   "inversion",
+                 INVERT_DISPLAY:   "inversion",
+                 SEG_REMAP:        "seg_remap",
+                 SEG_REMAP | 0x01: "seg_remap",
+                 COM_SCAN_INC:     "com_scan",
+                 COM_SCAN_DEC:     "com_scan",
+                 SET_COM_PINS:     "com_pins"}
+
+    # Nr of parameter bytes following each command byte with parameters
+    COMMAND_PARAMS = {SET_MEMORY_MODE: 1, SET_COL_ADDRESS: 2, SET_PAGE_ADDRESS: 2,
+                      RIGHT_HORIZ_SCROLL: 6, LEFT_HORIZ_SCROLL: 6,
+                      VERT_AND_RIGHT_HORIZ_SCROLL: 5, VERT_AND_LEFT_HORIZ_SCROLL: 5,
+                      SET_CONTRAST: 1, CHARGE_PUMP: 1, SET_VERT_SCROLL_AREA: 2,
+                      SET_MULTIPLEX: 1, SET_DISPLAY_OFFSET: 1, SET_DISPLAY_CLOCK_DIV: 1,
+                      SET_PRECHARGE: 1, SET_COM_PINS: 1, SET_VCOM_DETECT: 1}
+
+
+    # session:      transport (ff32bus.Transport) that command() and data() write through:
+    #               a ff32bus.FF32Session, or ff32emu.EmulatedFF32 to run without hardware.
+    #               Defaults to the process wide shared FF32Session, so other FF32
+    #               drivers can use the same device.
+    # bitmap_class: Bitmap implementation used for the display buffer and by
+    #               ScrollingList, e.g. ff32numpy.NumpyBitmap. Defaults to SSD1306.Bitmap
+    # threaded:     start the writer thread, so display() does not wait for the transfer
+    # bus:          ff32bus.FF32Bus shared with other displays on the same FF32. Its
+    #               session is used and its thread sends the frames (implies threaded)
+    # font:         font of draw_text/draw_text2, e.g. ff32fonts.load("font5x8.ff32f").
+    #               Defaults to font5x8.Font5x8, imported when text is first drawn
+    def __init__(self, slave_addr=0x3C, scl_pin=("A",5), sda_pin=("A",6), buffer_rows=64, buffer_cols=128, rows=64, cols=128, session=None, bitmap_class=None, threaded=False, bus=None, font=None):
         self.cols = cols
         self.rows = rows
         self.buffer_rows = buffer_rows
-        self.mem_bytes = self.buffer_rows * self.cols / 8 # total bytes in SSD1306 display ram
+        self.mem_bytes = self.buffer_rows * self.cols // 8 # total bytes in SSD1306 display ram
         self.scl_pin = scl_pin
         self.sda_pin = sda_pin
+        self.pins = (scl_pin, sda_pin)
         self.slave_addr = slave_addr
-        with pyff32.FF32() as ff32:
-        # configure I2C bus on FF32 chip
-            ff32.setI2CPins(self.scl_pin, self.sda_pin)
-        self.font = font5x8.Font5x8
+        if bus is not None:
+            session = bus.session
+        if session is None:
+            session = ff32bus.FF32Session.shared()
+        self.session = session
+        self.is_open = False
+        self.open()
+        # configure I2C bus on FF32 chip, unless the session already has our pins
+        self.select(False)
+        self.font = font
         self.col_offset = 0
+        if bitmap_class is not None:
+            self.Bitmap = bitmap_class
         self.bitmap = self.Bitmap(buffer_cols, buffer_rows)
         self.flipped = False
+        self.scrolling = False
+        # Copy of what the display ram holds for self.bitmap (None if unknown)
+        self.shadow = None
+        self.shadow_offset = 0
+        # Model of the controller registers: register name to the command that
+        # set it last. Registers not in here are unknown.
+        self.registers = {}
+        # Writer thread and its front buffers (see start_writer)
+        self.writer = None
+        self.front = None
+        self.sending = None
+        self.frame_ready = threading.Condition()
+        self.frames_sent = 0
+        self.frames_dropped = 0
+        self.metrics = None
+        if threaded or bus is not None:
+            self.start_writer(bus)
+
+    # The FF32 session stays open for the life of this object (or until close())
+    def open(self):
+        if not self.is_open:
+            self.session.open()
+            self.is_open = True
+
+    def close(self):
+        self.stop_writer()
+        if self.is_open:
+            self.is_open = False
+            self.session.close()
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
 
     def command(self, *commandbytes):
-        # Every command byte and following parameter(s) has to be preceded by
-        # the COMMAND_MODE byte to mark it as command.
-        # Command mode: first byte to send = COMMAND_MODE (Co=0 D/C#=1)
-        for i in commandbytes:
-            senddata = bytearray([self.COMMAND_MODE])
-            senddata.append(i)
-            with pyff32.FF32() as ff32:
-                ff32.writeBlockI2C(self.slave_addr, senddata)
+        # A command byte and its parameter(s) are sent as one command stream:
+        # first byte to send = COMMAND_MODE (Co=0 D/C#=0), the command bytes follow.
+        with self.session.lock:
+            self.track(*self.split_commands(commandbytes))
+            self.send_commands(self.compile_commands(commandbytes))
+
+    # Splits a stream of command bytes, as command() takes them, into commands
+    # (tuples of command byte and parameters)
+    def split_commands(self, commandbytes):
+        commands = []
+        i = 0
+        while i < len(commandbytes):
+            end = i + 1 + self.COMMAND_PARAMS.get(commandbytes[i], 0)
+            commands.append(tuple(commandbytes[i:end]))
+            i = end
+        return commands
+
+    # Sends several commands (each a tuple of command byte and parameters, or a
+    # single command byte) in as few I2C transactions as possible.
+    #   oled.commands((oled.SET_PAGE_ADDRESS, 0, 7), oled.DISPLAY_ON)
+    def commands(self, *commands):
+        with self.session.lock:
+            self.track(*commands)
+            self.send_commands(self.compile_commands(*commands))
+
+    # Like commands(), but leaves out the commands that set a register of the
+    # register model to the value it already has.
+    def update_registers(self, *commands):
+        with self.session.lock:
+            changed = []
+            for command in commands:
+                if isinstance(command, int):
+                    command = (command,)
+                key = self.REGISTERS.get(command[0])
+                if key is None or self.registers.get(key) != tuple(command):
+                    changed.append(command)
+            if changed:
+                self.commands(*changed)
+
+    # Updates the register model for commands about to be sent
+    def track(self, *commands):
+        for command in commands:
+            if isinstance(command, int):
+                command = (command,)
+            op = command[0]
+            key = self.REGISTERS.get(op)
+            if key is not None:
+                self.registers[key] = tuple(command)
+            elif self.SET_START_LINE <= op <= self.SET_START_LINE | 0x3F:
+                self.registers["start_line"] = (op,)
+            elif op == self.ACTIVATE_SCROLL or op == self.DEACTIVATE_SCROLL:
+                # the scroll engine changes the display ram behind our back
+                self.scrolling = op == self.ACTIVATE_SCROLL
+                self.shadow = None
+                self.forget_window()
+            elif op <= self.SET_HIGH_COLUMN | 0x0F or 0xB0 <= op <= 0xB7 or self.RIGHT_HORIZ_SCROLL <= op <= self.ACTIVATE_SCROLL:
+                # these move the ram pointer away from the start of the address window
+                self.forget_window()
+
+    # After a data transfer that filled the address window a whole nr of times
+    # the ram pointer is back at the start of the window, so the next transfer to
+    # the same window does not need to set it again. Otherwise forget the window.
+    def track_data(self, nbytes):
+        page_window = self.registers.get("page_window")
+        col_window = self.registers.get("col_window")
+        if (page_window is None or col_window is None or
+            self.registers.get("memory_mode") not in ((self.SET_MEMORY_MODE, self.MEMORY_MODE_HORIZ),
+                                                      (self.SET_MEMORY_MODE, self.MEMORY_MODE_VERT))):
+            self.forget_window()
+            return
+        window = (page_window[2] - page_window[1] + 1) * (col_window[2] - col_window[1] + 1)
+        if nbytes % window != 0:
+            self.forget_window()
+
+    def forget_window(self):
+        self.registers.pop("page_window", None)
+        self.registers.pop("col_window", None)
+
+    # Forgets all the driver knows about the display: the register model and
+    # the shadow of the display ram. Call it when the panel may have been reset
+    # or was written to by other software; the next display() sends a full frame.
+    def invalidate(self):
+        with self.session.lock:
+            self.registers = {}
+            self.shadow = None
+
+    # Packs commands into COMMAND_MODE messages of at most MAX_FF32_MSG bytes.
+    # A command is never split from its parameters. The result can be kept
+    # and replayed with send_commands() for sequences that are sent often.
+    def compile_commands(self, *commands):
+        messages = []
+        senddata = bytearray([self.COMMAND_MODE])
+        for command in commands:
+            if isinstance(command, int):
+                command = (command,)
+            if len(senddata) + len(command) > self.MAX_FF32_MSG and len(senddata) > 1:
+                messages.append(senddata)
+                senddata = bytearray([self.COMMAND_MODE])
+            senddata.extend(command)
+        if len(senddata) > 1:
+            messages.append(senddata)
+        return messages
+
+    # Sends compiled commands. The register model is not updated: after sending
+    # commands other than the init sequence this way, call invalidate().
+    def send_commands(self, messages):
+        try:
+            for senddata in messages:
+                self.session.write(self.slave_addr, senddata, self.pins)
+        except Exception:
+            self.invalidate()
+            raise
  
     def data(self, databytes):
         # Data mode: first byte to send = DATA_MODE (Co=0 D/C#=1)
         # Databytes follow after that. The datapointer is maintained by SSD1306
         # FF32 can only send 60byte chuncks of data at a time
-        # So send chunk if senddata array reaches max chunk size
-        senddata = bytearray([self.DATA_MODE])
-        for i in range(0,len(databytes)):
-            senddata.append(databytes[i])
-            if len(senddata) >= self.MAX_FF32_MSG-1:
-                with pyff32.FF32() as ff32:
-                    ff32.writeBlockI2C(self.slave_addr, senddata)
-                # re-init senddata for next chunk
+        # So databytes are sent in chunks of DATA_CHUNK bytes, sliced from a
+        # memoryview so the buffer itself is not copied.
+        try:
+            view = memoryview(databytes)
+        except TypeError:
+            view = memoryview(bytearray(databytes))
+        try:
+            for i in range(0, len(view), self.DATA_CHUNK):
                 senddata = bytearray([self.DATA_MODE])
-        # send remainder (at least if senddata contains more than DATA_MODE byte)
-        if len(senddata) > 1:
-                with pyff32.FF32() as ff32:
-                    ff32.writeBlockI2C(self.slave_addr, senddata)
+                senddata += view[i:i + self.DATA_CHUNK]
+                self.session.write(self.slave_addr, senddata, self.pins)
+        except Exception:
+            self.invalidate()
+            raise
+        self.track_data(len(view))
         
+    # Compiled init sequences, by (rows, vcc_state)
+    init_sequences = {}
+
     def begin(self, vcc_state = SWITCH_CAP_VCC):
         time.sleep(0.001) # 1ms
-        self.command(self.DISPLAY_OFF)
-        self.command(self.SET_DISPLAY_CLOCK_DIV, 0x80)
+        key = (self.rows, vcc_state)
+        if key not in self.init_sequences:
+            self.init_sequences[key] = self.compile_init(vcc_state)
+        with self.session.lock:
+            self.invalidate()
+            self.send_commands(self.init_sequences[key])
+            self.track(*self.init_commands(vcc_state))
+
+    def compile_init(self, vcc_state = SWITCH_CAP_VCC):
+        return self.compile_commands(*self.init_commands(vcc_state))
+
+    def init_commands(self, vcc_state = SWITCH_CAP_VCC):
+        commands = [self.DISPLAY_OFF,
+                    (self.SET_DISPLAY_CLOCK_DIV, 0x80)]
 
         # support for 128x32 and 128x64 line models
         if self.rows == 64:
-            self.command(self.SET_MULTIPLEX, 0x3F) 
-            self.command(self.SET_COM_PINS, 0x12)
+            commands += [(self.SET_MULTIPLEX, 0x3F),
+                         (self.SET_COM_PINS, 0x12)]
         else:
-            self.command(self.SET_MULTIPLEX, 0x1F)
-            self.command(self.SET_COM_PINS, 0x02)
+            commands += [(self.SET_MULTIPLEX, 0x1F),
+                         (self.SET_COM_PINS, 0x02)]
             
-        self.command(self.SET_DISPLAY_OFFSET, 0x00)
-        self.command(self.SET_START_LINE | 0x00)
+        commands += [(self.SET_DISPLAY_OFFSET, 0x00),
+                     self.SET_START_LINE | 0x00]
         # support for internally supplied Vcc (Charge pump) or 
         # external supplied Vcc
         if (vcc_state == self.EXTERNAL_VCC):
-            self.command(self.CHARGE_PUMP, 0x10)
+            commands.append((self.CHARGE_PUMP, 0x10))
         else:
-            self.command(self.CHARGE_PUMP, 0x14)
-        self.command(self.SET_MEMORY_MODE, 0x00)
-        self.command(self.SEG_REMAP | 0x01)
-        self.command(self.COM_SCAN_DEC)
-        self.command(self.SET_CONTRAST, 0xbf)
+            commands.append((self.CHARGE_PUMP, 0x14))
+        commands += [(self.SET_MEMORY_MODE, 0x00),
+                     self.SEG_REMAP | 0x01,
+                     self.COM_SCAN_DEC,
+                     (self.SET_CONTRAST, 0xbf)]
         if (vcc_state == self.EXTERNAL_VCC):
-            self.command(self.SET_PRECHARGE, 0x22)
+            commands.append((self.SET_PRECHARGE, 0x22))
         else:
-            self.command(self.SET_PRECHARGE, 0xF1)
-        self.command(self.SET_VCOM_DETECT, 0x40)
-        self.command(self.DISPLAY_ALL_ON_RESUME)
-        self.command(self.NORMAL_DISPLAY)
-        self.command(self.DISPLAY_ON)
+            commands.append((self.SET_PRECHARGE, 0xF1))
+        commands += [(self.SET_VCOM_DETECT, 0x40),
+                     self.DISPLAY_ALL_ON_RESUME,
+                     self.NORMAL_DISPLAY,
+                     self.DISPLAY_ON]
+        return commands
     
-    def select(self):
-        # reconfigure I2C bus on FF32 chip after talking to other I2C device
-        with pyff32.FF32() as ff32:
-            ff32.setI2CPins(self.scl_pin, self.sda_pin)
+    def select(self, force=True):
+        # reconfigure I2C bus on FF32 chip after talking to other I2C device.
+        # Always reprograms the pins (unless force=False): the FF32 may have been
+        # reconfigured outside the session. Writes reprogram them only when they change.
+        self.session.set_pins(self.scl_pin, self.sda_pin, force)
    
     def clear_display(self):
         self.bitmap.clear()
 
     def invert_display(self):
-        self.command(self.INVERT_DISPLAY)
+        self.update_registers(self.INVERT_DISPLAY)
 
     def flip_display(self, flipped=True):
         self.flipped = flipped
         if flipped:
-            self.command(self.COM_SCAN_INC)
-            self.command(self.SEG_REMAP | 0x00)
+            self.update_registers(self.COM_SCAN_INC,
+                                  self.SEG_REMAP | 0x00)
         else:
-            self.command(self.COM_SCAN_DEC)
-            self.command(self.SET_COM_PINS, 0x02)
+            self.update_registers(self.COM_SCAN_DEC,
+                                  (self.SET_COM_PINS, 0x02))
 
     def normal_display(self):
-        self.command(self.NORMAL_DISPLAY)
+        self.update_registers(self.NORMAL_DISPLAY)
 
     def set_contrast(self, contrast=0x8f):
-        self.command(self.SET_CONTRAST, contrast)
+        self.update_registers((self.SET_CONTRAST, contrast))
 
+    # Starts the SSD1306 scroll engine: pages start_page..end_page move one column
+    # every <frames> frames (a key of SCROLL_INTERVALS) in direction SCROLL_RIGHT or
+    # SCROLL_LEFT, wrapping around within the display ram. A vertical_offset > 0
+    # also scrolls vertically by that many rows per step (see set_vertical_scroll_area).
+    # The scroll runs on the display without any further bus traffic.
+    def start_scroll(self, start_page=0, end_page=None, frames=5, direction=SCROLL_LEFT, vertical_offset=0):
+        if end_page is None:
+            end_page = self.rows // 8 - 1
+        if frames not in self.SCROLL_INTERVALS:
+            raise ValueError("frames must be one of %s" % sorted(self.SCROLL_INTERVALS))
+        interval = self.SCROLL_INTERVALS[frames]
+        if vertical_offset:
+            if direction > 0:
+                setup = (self.VERT_AND_RIGHT_HORIZ_SCROLL, 0x00, start_page, interval, end_page, vertical_offset)
+            else:
+                setup = (self.VERT_AND_LEFT_HORIZ_SCROLL, 0x00, start_page, interval, end_page, vertical_offset)
+        else:
+            if direction > 0:
+                setup = (self.RIGHT_HORIZ_SCROLL, 0x00, start_page, interval, end_page, 0x00, 0xFF)
+            else:
+                setup = (self.LEFT_HORIZ_SCROLL, 0x00, start_page, interval, end_page, 0x00, 0xFF)
+        # track() notes that the display ram is no longer known
+        self.commands(self.DEACTIVATE_SCROLL, setup, self.ACTIVATE_SCROLL)
+
+    # Stops the scroll engine. The display ram has to be rewritten afterwards,
+    # so the next display() sends a full frame.
+    def stop_scroll(self):
+        self.command(self.DEACTIVATE_SCROLL)
+
+    # Rows top_fixed..top_fixed+scroll_rows-1 take part in vertical scrolling
+    def set_vertical_scroll_area(self, top_fixed, scroll_rows):
+        self.command(self.SET_VERT_SCROLL_AREA, top_fixed, scroll_rows)
+
+    # Starts counting and timing what this display does (see ff32metrics) and
+    # returns the ff32metrics.Metrics. on_frame_start(display) and
+    # on_frame_end(display, frame) are called around every frame sent.
+    # Without metrics enabled the display runs uninstrumented.
+    def enable_metrics(self, on_frame_start=None, on_frame_end=None, window=ff32metrics.RollingTimer.WINDOW):
+        self.disable_metrics()
+        metrics = ff32metrics.Metrics(on_frame_start, on_frame_end, window)
+        metrics.attach(self)
+        self.metrics = metrics
+        return metrics
+
+    def disable_metrics(self):
+        if self.metrics is not None:
+            self.metrics.detach()
+            self.metrics = None
+
+    # Transfers the parts of the bitmap that changed since the last display().
+    # Changed pages are combined into as few address windows as possible; if
+    # that costs more I2C transactions than a full frame, the full frame is sent.
+    # With the writer thread running (see start_writer) the frame is only queued.
     def display(self):
-        self.display_block(self.bitmap, 0, 0, self.cols, self.col_offset)
+        if self.writer is not None:
+            self.queue_frame()
+        else:
+            self.send_frame(self.bitmap, self.col_offset)
 
     def display_cols(self, start_col, count):
         self.display_block(self.bitmap, 0, start_col, count, self.col_offset)
 
+    # Sends bitmap (self.bitmap or a snapshot of it) as the new display contents
+    def send_frame(self, bitmap, col_offset):
+        with self.session.lock:
+            if self.shadow is None or self.shadow_offset != col_offset:
+                self.display_block(bitmap, 0, 0, self.cols, col_offset)
+            else:
+                windows = self.dirty_windows(bitmap, col_offset)
+                cost = 0
+                for (page_start, page_end, col_start, col_end) in windows:
+                    cost += self.transfer_cost((page_end - page_start + 1) * (col_end - col_start + 1))
+                if cost >= self.transfer_cost(self.cols * bitmap.bytes_per_col):
+                    self.display_block(bitmap, 0, 0, self.cols, col_offset)
+                else:
+                    for (page_start, page_end, col_start, col_end) in windows:
+                        self.display_window(bitmap, col_offset, page_start, page_end, col_start, col_end)
+            bitmap.mark_clean()
+
+    # Nr of I2C transactions needed to send nbytes to one address window
+    def transfer_cost(self, nbytes):
+        return self.WINDOW_OVERHEAD + (nbytes + self.DATA_CHUNK - 1) // self.DATA_CHUNK
+
+    # Returns the address windows (page_start, page_end, col_start, col_end) in
+    # display columns covering the bytes of bitmap that differ from the shadow.
+    # Adjacent pages are merged into one window when that is cheaper.
+    def dirty_windows(self, bitmap, col_offset):
+        data = bitmap.data
+        shadow = self.shadow
+        bpc = bitmap.bytes_per_col
+        offset = col_offset
+        windows = []
+        current = None
+        for page in range(0, bpc):
+            # dirty range in display columns, trimmed to the bytes that really changed
+            lo = max(bitmap.dirty_lo[page] - offset, 0)
+            hi = min(bitmap.dirty_hi[page] - offset, self.cols - 1)
+            while lo <= hi and data[(lo + offset) * bpc + page] == shadow[lo * bpc + page]:
+                lo += 1
+            while hi >= lo and data[(hi + offset) * bpc + page] == shadow[hi * bpc + page]:
+                hi -= 1
+            if lo > hi:
+                continue
+            if current is not None:
+                (page_start, page_end, col_start, col_end) = current
+                merged = (page_start, page, min(col_start, lo), max(col_end, hi))
+                merged_cost = self.transfer_cost((page - page_start + 1) * (merged[3] - merged[2] + 1))
+                split_cost = (self.transfer_cost((page_end - page_start + 1) * (col_end - col_start + 1)) +
+                              self.transfer_cost(hi - lo + 1))
+                if merged_cost <= split_cost:
+                    current = merged
+                    continue
+                windows.append(current)
+            current = (page, page, lo, hi)
+        if current is not None:
+            windows.append(current)
+        return windows
+
+    # Sends pages page_start..page_end of display columns col_start..col_end from
+    # bitmap and updates the shadow accordingly.
+    def display_window(self, bitmap, col_offset, page_start, page_end, col_start, col_end):
+        bpc = bitmap.bytes_per_col
+        offset = col_offset
+        view = memoryview(bitmap.data)
+        if page_start == 0 and page_end == bpc - 1:
+            databytes = view[(col_start + offset) * bpc:(col_end + 1 + offset) * bpc]
+        else:
+            databytes = bytearray()
+            for col in range(col_start, col_end + 1):
+                start = (col + offset) * bpc
+                databytes += view[start + page_start:start + page_end + 1]
+        with self.session.lock:
+            self.update_registers((self.SET_MEMORY_MODE, self.MEMORY_MODE_VERT),
+                                  (self.SET_PAGE_ADDRESS, page_start, page_end),
+                                  (self.SET_COL_ADDRESS, col_start, col_end))
+            self.data(databytes)
+            pages = page_end - page_start + 1
+            for i in range(0, col_end - col_start + 1):
+                start = (col_start + i) * bpc + page_start
+                self.shadow[start:start + pages] = databytes[i * pages:(i + 1) * pages]
+
+    # Starts the writer thread. From then on display() copies the bitmap to a
+    # front buffer and returns at once; the writer thread sends the frames.
+    # When frames are queued faster than they can be sent, only the latest is sent.
+    # Drawing into the bitmap can continue while a frame is being sent.
+    # With a bus (ff32bus.FF32Bus) given, the bus thread sends the frames instead.
+    def start_writer(self, bus=None):
+        if self.writer is not None:
+            return
+        self.front = self.Bitmap(self.bitmap.cols, self.bitmap.rows)
+        self.sending = self.Bitmap(self.bitmap.cols, self.bitmap.rows)
+        self.front_offset = self.col_offset
+        self.frame_pending = False
+        self.writer_busy = False
+        self.writer_stop = False
+        self.writer_error = None
+        if bus is not None:
+            self.frame_ready = bus.frame_ready
+            self.writer = bus
+            bus.attach(self)
+        else:
+            self.writer = threading.Thread(target=self.writer_loop)
+            self.writer.daemon = True
+            self.writer.start()
+
+    # Stops the writer thread after it sent the last queued frame
+    def stop_writer(self):
+        if self.writer is None:
+            return
+        if isinstance(self.writer, threading.Thread):
+            with self.frame_ready:
+                self.writer_stop = True
+                self.frame_ready.notify_all()
+            self.writer.join()
+        else:
+            self.wait_idle()
+            self.writer.detach(self)
+            self.frame_ready = threading.Condition()
+        self.writer = None
+        self.check_writer()
+
+    # Queues the current bitmap for the writer thread and returns at once
+    def queue_frame(self):
+        with self.frame_ready:
+            self.check_writer()
+            front = self.front
+            if self.frame_pending:
+                self.frames_dropped += 1
+            else:
+                front.mark_clean()
+            front.data[:] = self.bitmap.data
+            front.merge_dirty(self.bitmap)
+            self.front_offset = self.col_offset
+            self.frame_pending = True
+            self.frame_ready.notify_all()
+        self.bitmap.mark_clean()
+
+    def writer_loop(self):
+        while True:
+            with self.frame_ready:
+                while not self.frame_pending and not self.writer_stop:
+                    self.frame_ready.wait()
+                if not self.frame_pending:
+                    return
+                col_offset = self.take_frame()
+            self.send_taken(col_offset)
+            with self.frame_ready:
+                self.frame_done()
+                self.frame_ready.notify_all()
+
+    # Takes the queued frame for sending; returns its column offset.
+    # Called with frame_ready held.
+    def take_frame(self):
+        (self.front, self.sending) = (self.sending, self.front)
+        self.frame_pending = False
+        self.writer_busy = True
+        return self.front_offset
+
+    # Sends the taken frame. Errors are kept for check_writer().
+    def send_taken(self, col_offset):
+        try:
+            self.send_frame(self.sending, col_offset)
+        except Exception as e:
+            # display ram contents are unknown now: next frame is sent in full
+            self.shadow = None
+            self.writer_error = e
+
+    # Called with frame_ready held after send_taken()
+    def frame_done(self):
+        self.writer_busy = False
+        self.frames_sent += 1
+
+    # Raises the error the writer thread ran into, if any
+    def check_writer(self):
+        error = self.writer_error
+        if error is not None:
+            self.writer_error = None
+            raise error
+
+    # Waits until the writer thread has sent all queued frames.
+    # Returns False if that did not happen within timeout seconds.
+    def wait_idle(self, timeout=None):
+        if self.writer is None:
+            return True
+        if timeout is not None:
+            deadline = time.time() + timeout
+        with self.frame_ready:
+            while self.frame_pending or self.writer_busy:
+                if timeout is None:
+                    self.frame_ready.wait()
+                else:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        return False
+                    self.frame_ready.wait(remaining)
+            self.check_writer()
+        return True
+
+    # Displays the bitmap and waits until it has been sent
+    def flush(self, timeout=None):
+        self.display()
+        return self.wait_idle(timeout)
+
     # Transfers data from the passed bitmap (instance of ssd1306.Bitmap)
     # starting at row <row> col <col>.
     # Both row and bitmap.rows will be divided by 8 to get page addresses,
@@ -229,12 +703,31 @@ class SSD1306:
         page_end   = page_start + page_count - 1
         col_start  = col
         col_end    = col + col_count - 1
-        self.command(self.SET_MEMORY_MODE, self.MEMORY_MODE_VERT)
-        self.command(self.SET_PAGE_ADDRESS, page_start, page_end)
-        self.command(self.SET_COL_ADDRESS, col_start, col_end)
         start = col_offset * page_count
         length = col_count * page_count
-        self.data(bitmap.data[start:start+length])
+        # hold the session so the address window and the data stay together
+        with self.session.lock:
+            self.update_registers((self.SET_MEMORY_MODE, self.MEMORY_MODE_VERT),
+                                  (self.SET_PAGE_ADDRESS, page_start, page_end),
+                                  (self.SET_COL_ADDRESS, col_start, col_end))
+            self.data(memoryview(bitmap.data)[start:start+length])
+            self.update_shadow(bitmap, row, col, col_count, col_offset)
+
+    # Keeps the shadow of the display ram in line with a display_block transfer.
+    # Transfers of other bitmaps (or at another offset) make the shadow unknown,
+    # and so does the scroll engine while it runs: display() then sends full frames.
+    def update_shadow(self, bitmap, row, col, col_count, col_offset):
+        if self.scrolling or row != 0 or not (bitmap is self.bitmap or bitmap is self.front or bitmap is self.sending):
+            self.shadow = None
+            return
+        bpc = bitmap.bytes_per_col
+        if col == 0 and col_count == self.cols:
+            self.shadow = bitmap.data[col_offset * bpc:(col_offset + col_count) * bpc]
+            self.shadow_offset = col_offset
+        elif self.shadow is not None and col_offset - col == self.shadow_offset:
+            self.shadow[col * bpc:(col + col_count) * bpc] = bitmap.data[col_offset * bpc:(col_offset + col_count) * bpc]
+        else:
+            self.shadow = None
 
     # Diagnostic print of the memory buffer to stdout 
     def dump_buffer(self):
@@ -244,51 +737,77 @@ class SSD1306:
         self.bitmap.draw_pixel(x,y,on)
         
     def draw_text(self, x, y, string):
-        font_bytes = self.font.bytes
-        font_rows = self.font.rows
-        font_cols = self.font.cols
-        for c in string:
-            p = ord(c) * font_cols
-            for col in range(0,font_cols):
-                mask = font_bytes[p]
-                p+=1
-                for row in range(0,8):
-                    self.draw_pixel(x,y+row,mask & 0x1)
-                    mask >>= 1
-                x += 1
+        self.draw_text2(x, y, string, 1, 0)
 
+    # font5x8 text with every pixel scaled to size x size pixels and space
+    # blank columns between characters. Glyphs come from the bitmap's glyph cache.
     def draw_text2(self, x, y, string, size=2, space=1):
-        font_bytes = self.font.bytes
-        font_rows = self.font.rows
-        font_cols = self.font.cols
+        bitmap = self.bitmap
+        cache = bitmap.glyph_cache
+        page = y // 8
+        shift = y % 8
+        if self.font is None:
+            # imported on first use: the font module is large and slow to import
+            import font5x8
+            self.font = font5x8.Font5x8
         for c in string:
-            p = ord(c) * font_cols
-            for col in range(0,font_cols):
-                mask = font_bytes[p]
-                p+=1
-                py = y
-                for row in range(0,8):
-                    for sy in range(0,size):
-                        px = x
-                        for sx in range(0,size):
-                            self.draw_pixel(px,py,mask & 0x1)
-                            px += 1
-                        py += 1
-                    mask >>= 1
-                x += size
-            x += space
+            glyph = cache.get(ff32glyphs.render_font5x8, self.font, ord(c), shift, size)
+            bitmap.draw_glyph(x, page, glyph)
+            x += glyph[0] + space
 
     def clear_block(self, x0,y0,dx,dy):
         self.bitmap.clear_block(x0,y0,dx,dy)
+
+    def fill_block(self, x0,y0,dx,dy):
+        self.bitmap.fill_block(x0,y0,dx,dy)
+
+    def invert_block(self, x0,y0,dx,dy):
+        self.bitmap.invert_block(x0,y0,dx,dy)
+
+    def blit(self, bitmap, x=0, y=0, cols=None, rows=None):
+        self.bitmap.blit(bitmap, x, y, cols, rows)
+
+    # Draws image (a PBM file, NumPy 2-D array, PIL image or ff32images.Image)
+    # with its top left corner at x,y. Conversions are cached (see ff32images).
+    def draw_image(self, image, x=0, y=0, threshold=128, dither=False, invert=False):
+        # imported on first use: it loads NumPy, which is slow to import
+        import ff32images
+        image = ff32images.cache.get(image, self.Bitmap, threshold, dither, invert)
+        self.bitmap.blit(image.bitmap, x, y, image.width, image.height)
+
+    def hline(self, x, y, w, op=BLOCK_FILL):
+        self.bitmap.hline(x, y, w, op)
+
+    def vline(self, x, y, h, op=BLOCK_FILL):
+        self.bitmap.vline(x, y, h, op)
+
+    def rect(self, x, y, w, h, op=BLOCK_FILL):
+        self.bitmap.rect(x, y, w, h, op)
+
+    def fill_rect(self, x, y, w, h, op=BLOCK_FILL):
+        self.bitmap.fill_rect(x, y, w, h, op)
+
+    def line(self, x0, y0, x1, y1, op=BLOCK_FILL):
+        self.bitmap.line(x0, y0, x1, y1, op)
+
+    def circle(self, x0, y0, r, op=BLOCK_FILL):
+        self.bitmap.circle(x0, y0, r, op)
+
+    def fill_circle(self, x0, y0, r, op=BLOCK_FILL):
+        self.bitmap.fill_circle(x0, y0, r, op)
         
-    def draw_text3(self, x, y, string, font):
-        return self.bitmap.draw_text(x,y,string,font)
+    # Text in a proportional font, every pixel scaled to size x size pixels
+    def draw_text3(self, x, y, string, font, size=1):
+        return self.bitmap.draw_text(x,y,string,font,size)
 
-    def text_width(self, string, font):
-        return self.bitmap.text_width(string, font)
+    def text_width(self, string, font, size=1):
+        return self.bitmap.text_width(string, font, size)
 
     class Bitmap:
     
+        # Glyphs rendered for draw_text, shared by all bitmaps
+        glyph_cache = ff32glyphs.GlyphCache()
+
         # Pixels are stored in column-major order!
         # This makes it easy to reference a vertical slice of the display buffer
         # and we use the to achieve reasonable performance vertical scrolling 
@@ -296,22 +815,76 @@ class SSD1306:
         def __init__(self, cols, rows):
             self.rows = rows
             self.cols = cols
-            self.bytes_per_col = rows / 8
-            self.data = [0] * (self.cols * self.bytes_per_col)
+            self.bytes_per_col = rows // 8
+            self.data = bytearray(self.cols * self.bytes_per_col)
+            # Per page the range of columns changed since the last mark_clean().
+            # A clean page has dirty_lo > dirty_hi.
+            self.dirty_lo = [0] * self.bytes_per_col
+            self.dirty_hi = [self.cols - 1] * self.bytes_per_col
     
         def clear(self):
-            for i in range(0,len(self.data)):
-                self.data[i] = 0
+            self.data[:] = bytearray(len(self.data))
+            self.mark_dirty(0, 0, self.cols, self.rows)
+
+        # Clips the block of dx by dy pixels at x0,y0 to the bitmap.
+        # Returns the inclusive corners (x0, y0, x1, y1) or None if nothing is left.
+        def clip_block(self, x0, y0, dx, dy):
+            x1 = min(x0 + dx, self.cols) - 1
+            y1 = min(y0 + dy, self.rows) - 1
+            x0 = max(x0, 0)
+            y0 = max(y0, 0)
+            if x0 > x1 or y0 > y1:
+                return None
+            return (x0, y0, x1, y1)
+
+        # Returns (page, bit mask) for every page touched by rows y0..y1
+        def page_masks(self, y0, y1):
+            masks = []
+            for page in range(y0 // 8, y1 // 8 + 1):
+                top = max(y0 - page * 8, 0)
+                bottom = min(y1 - page * 8, 7)
+                masks.append((page, (0xFF << top) & (0xFF >> (7 - bottom))))
+            return masks
+
+        # Marks the block of dx by dy pixels at x0,y0 as changed
+        def mark_dirty(self, x0, y0, dx, dy):
+            block = self.clip_block(x0, y0, dx, dy)
+            if block is None:
+                return
+            (x0, y0, x1, y1) = block
+            for page in range(y0 // 8, y1 // 8 + 1):
+                if x0 < self.dirty_lo[page]:
+                    self.dirty_lo[page] = x0
+                if x1 > self.dirty_hi[page]:
+                    self.dirty_hi[page] = x1
+
+        # Adds the changed areas of bitmap other (of the same size) to ours
+        def merge_dirty(self, other):
+            for page in range(0, self.bytes_per_col):
+                if other.dirty_lo[page] < self.dirty_lo[page]:
+                    self.dirty_lo[page] = other.dirty_lo[page]
+                if other.dirty_hi[page] > self.dirty_hi[page]:
+                    self.dirty_hi[page] = other.dirty_hi[page]
+
+        def mark_clean(self):
+            self.dirty_lo = [self.cols] * self.bytes_per_col
+            self.dirty_hi = [-1] * self.bytes_per_col
+
+        def is_dirty(self):
+            for page in range(0, self.bytes_per_col):
+                if self.dirty_lo[page] <= self.dirty_hi[page]:
+                    return True
+            return False
 
         # Diagnostic print of the memory buffer to stdout 
         def dump(self):
             for y in range(0, self.rows):
-                mem_row = y/8
+                mem_row = y//8
                 bit_mask = 1 << (y % 8)
                 line = ""
                 for x in range(0, self.cols):
                     mem_col = x
-                    offset = mem_row + self.rows/8 * mem_col
+                    offset = mem_row + self.rows//8 * mem_col
                     if self.data[offset] & bit_mask:
                         line += '*'
                     else:
@@ -323,22 +896,202 @@ class SSD1306:
             if (x<0 or x>=self.cols or y<0 or y>=self.rows):
                 return
             mem_col = x
-            mem_row = y / 8
+            mem_row = y // 8
             bit_mask = 1 << (y % 8)
-            offset = mem_row + self.rows/8 * mem_col
+            offset = mem_row + self.rows//8 * mem_col
     
             if on:
                 self.data[offset] |= bit_mask
             else:
                 self.data[offset] &= (0xFF - bit_mask)
+            if x < self.dirty_lo[mem_row]:
+                self.dirty_lo[mem_row] = x
+            if x > self.dirty_hi[mem_row]:
+                self.dirty_hi[mem_row] = x
     
+        BLOCK_CLEAR  = 0
+        BLOCK_FILL   = 1
+        BLOCK_INVERT = 2
+
         def clear_block(self, x0,y0,dx,dy):
-            for x in range(x0,x0+dx):
-                for y in range(y0,y0+dy):
-                    self.draw_pixel(x,y,0)
+            self.block_op(x0, y0, dx, dy, self.BLOCK_CLEAR)
+
+        def fill_block(self, x0,y0,dx,dy):
+            self.block_op(x0, y0, dx, dy, self.BLOCK_FILL)
+
+        def invert_block(self, x0,y0,dx,dy):
+            self.block_op(x0, y0, dx, dy, self.BLOCK_INVERT)
+
+        # Clears, fills or inverts a block a byte (8 rows of a column) at a time
+        def block_op(self, x0, y0, dx, dy, op):
+            block = self.clip_block(x0, y0, dx, dy)
+            if block is None:
+                return
+            (x0, y0, x1, y1) = block
+            data = self.data
+            bpc = self.bytes_per_col
+            for (page, mask) in self.page_masks(y0, y1):
+                offsets = range(x0 * bpc + page, (x1 + 1) * bpc, bpc)
+                if op == self.BLOCK_CLEAR:
+                    mask = 0xFF - mask
+                    for offset in offsets:
+                        data[offset] &= mask
+                elif op == self.BLOCK_FILL:
+                    for offset in offsets:
+                        data[offset] |= mask
+                else:
+                    for offset in offsets:
+                        data[offset] ^= mask
+            self.mark_dirty(x0, y0, x1 - x0 + 1, y1 - y0 + 1)
+
+        # Copies bitmap src (or its top left cols x rows pixels) into this bitmap
+        # with its top left corner at x,y. Parts falling outside this bitmap are clipped.
+        def blit(self, src, x=0, y=0, cols=None, rows=None):
+            block = self.clip_block(x, y, src.cols if cols is None else min(cols, src.cols),
+                                     src.rows if rows is None else min(rows, src.rows))
+            if block is None:
+                return
+            (x0, y0, x1, y1) = block
+            data = self.data
+            bpc = self.bytes_per_col
+            src_bpc = src.bytes_per_col
+            masks = self.page_masks(y0, y1)
+            for col in range(x0, x1 + 1):
+                # the source column as one integer, shifted to its destination rows
+                start = (col - x) * src_bpc
+                bits = 0
+                for i in range(0, src_bpc):
+                    bits |= src.data[start + i] << (8 * i)
+                if y >= 0:
+                    bits <<= y
+                else:
+                    bits >>= -y
+                start = col * bpc
+                for (page, mask) in masks:
+                    data[start + page] = (data[start + page] & (0xFF - mask)) | ((bits >> (8 * page)) & mask)
+            self.mark_dirty(x0, y0, x1 - x0 + 1, y1 - y0 + 1)
+
+        # Drawing primitives. op is BLOCK_FILL (set pixels), BLOCK_CLEAR or
+        # BLOCK_INVERT (XOR). Everything is drawn as horizontal and vertical spans
+        # through block_op, so vertical spans are masked byte operations, and
+        # every pixel is touched once (XOR drawing does not cancel itself out).
+
+        def hline(self, x, y, w, op=BLOCK_FILL):
+            self.block_op(x, y, w, 1, op)
+
+        def vline(self, x, y, h, op=BLOCK_FILL):
+            self.block_op(x, y, 1, h, op)
+
+        def fill_rect(self, x, y, w, h, op=BLOCK_FILL):
+            self.block_op(x, y, w, h, op)
+
+        # Outline of the rectangle of w by h pixels at x,y
+        def rect(self, x, y, w, h, op=BLOCK_FILL):
+            if w <= 0 or h <= 0:
+                return
+            self.hline(x, y, w, op)
+            if h > 1:
+                self.hline(x, y + h - 1, w, op)
+            if h > 2:
+                self.vline(x, y + 1, h - 2, op)
+                if w > 1:
+                    self.vline(x + w - 1, y + 1, h - 2, op)
+
+        # Bresenham line from x0,y0 to x1,y1 (both ends included), drawn as the
+        # runs of pixels on the same row (flat lines) or column (steep lines)
+        def line(self, x0, y0, x1, y1, op=BLOCK_FILL):
+            steep = abs(y1 - y0) > abs(x1 - x0)
+            if steep:
+                (x0, y0, x1, y1) = (y0, x0, y1, x1)
+            if x0 > x1:
+                (x0, y0, x1, y1) = (x1, y1, x0, y0)
+            dx = x1 - x0
+            dy = abs(y1 - y0)
+            ystep = 1 if y0 < y1 else -1
+            err = dx // 2
+            y = y0
+            run_start = x0
+            for x in range(x0, x1 + 1):
+                err -= dy
+                if err < 0 or x == x1:
+                    # the run on line y ends at x
+                    if steep:
+                        self.vline(y, run_start, x - run_start + 1, op)
+                    else:
+                        self.hline(run_start, y, x - run_start + 1, op)
+                    run_start = x + 1
+                if err < 0:
+                    y += ystep
+                    err += dx
+
+        # Per column x the (top, bottom) rows of the midpoint circle of radius r
+        # around x0,y0, and the rows of its outline in that column
+        def circle_columns(self, x0, y0, r):
+            points = set()
+            x = 0
+            y = r
+            f = 1 - r
+            while x <= y:
+                for (px, py) in ((x, y), (y, x)):
+                    points.update(((x0 + px, y0 + py), (x0 - px, y0 + py),
+                                   (x0 + px, y0 - py), (x0 - px, y0 - py)))
+                if f >= 0:
+                    y -= 1
+                    f -= 2 * y
+                x += 1
+                f += 2 * x + 1
+            columns = {}
+            for (px, py) in points:
+                columns.setdefault(px, []).append(py)
+            return columns
+
+        def circle(self, x0, y0, r, op=BLOCK_FILL):
+            if r < 0:
+                return
+            for (x, rows) in self.circle_columns(x0, y0, r).items():
+                rows.sort()
+                start = rows[0]
+                for i in range(1, len(rows) + 1):
+                    if i == len(rows) or rows[i] != rows[i - 1] + 1:
+                        self.vline(x, start, rows[i - 1] - start + 1, op)
+                        if i < len(rows):
+                            start = rows[i]
+
+        def fill_circle(self, x0, y0, r, op=BLOCK_FILL):
+            if r < 0:
+                return
+            for (x, rows) in self.circle_columns(x0, y0, r).items():
+                self.vline(x, min(rows), max(rows) - min(rows) + 1, op)
+
+        # Merges a glyph (see ff32glyphs) into the bitmap with its top left corner
+        # at column x, page (its vertical bit offset is part of the glyph)
+        def draw_glyph(self, x, page, glyph):
+            (width, pages, glyph_data, masks) = glyph
+            bpc = self.bytes_per_col
+            data = self.data
+            first_page = max(page, 0)
+            last_page = min(page + pages, bpc)
+            first_col = max(x, 0)
+            last_col = min(x + width, self.cols)
+            if first_page >= last_page or first_col >= last_col:
+                return
+            for col in range(first_col, last_col):
+                src = (col - x) * pages - page
+                dst = col * bpc
+                if masks is None:
+                    for p in range(first_page, last_page):
+                        data[dst + p] |= glyph_data[src + p]
+                else:
+                    for p in range(first_page, last_page):
+                        data[dst + p] = (data[dst + p] & (0xFF - masks[src + p])) | glyph_data[src + p]
+            for p in range(first_page, last_page):
+                if first_col < self.dirty_lo[p]:
+                    self.dirty_lo[p] = first_col
+                if last_col - 1 > self.dirty_hi[p]:
+                    self.dirty_hi[p] = last_col - 1
 
         # returns the width in pixels of the string allowing for kerning & interchar-spaces
-        def text_width(self, string, font):
+        def text_width(self, string, font, size=1):
             x = 0
             prev_char = None
             for c in string:
@@ -357,78 +1110,142 @@ class SSD1306:
             if prev_char != None:
                 x += prev_width
                 
-            return x
+            return x * size
               
-        def draw_text(self, x, y, string, font):
-            height = font.char_height
+        # draws string with its top left corner at x,y, every pixel scaled to
+        # size x size pixels; returns the x after the string
+        def draw_text(self, x, y, string, font, size=1):
             prev_char = None
+            cache = self.glyph_cache
+            page = y // 8
+            shift = y % 8
     
             for c in string:
                 if (c<font.start_char or c>font.end_char):
                     if prev_char != None:
-                        x += font.space_width + prev_width + font.gap_width
+                        x += (font.space_width + prev_width + font.gap_width) * size
                     prev_char = None
                 else:
                     pos = ord(c) - ord(font.start_char)
                     (width,offset) = font.descriptors[pos]
                     if prev_char != None:
-                        x += font.kerning[prev_char][pos] + font.gap_width
+                        x += (font.kerning[prev_char][pos] + font.gap_width) * size
                     prev_char = pos
                     prev_width = width
                     
-                    bytes_per_row = (width + 7) / 8
-                    for row in range(0,height):
-                        py = y + row
-                        mask = 0x80
-                        p = offset
-                        for col in range(0,width):
-                            px = x + col
-                            if (font.bitmaps[p] & mask):
-                                self.draw_pixel(px,py,1)  # for kerning, never draw black
-                            mask >>= 1
-                            if mask == 0:
-                                mask = 0x80
-                                p+=1
-                        offset += bytes_per_row
+                    # glyphs are transparent: for kerning, never draw black
+                    glyph = cache.get(ff32glyphs.render_proportional, font, pos, shift, size)
+                    self.draw_glyph(x, page, glyph)
               
             if prev_char != None:
-                x += prev_width
+                x += prev_width * size
     
             return x
 
     # This is a helper class to display a scrollable list of text lines.
     # The list must have at least 1 item.
+    #
+    # list:         any sequence, or an iterator/generator (read as far as scrolling
+    #               gets; scrolling back past the first item reads it to the end).
+    #               Items are rendered when they are about to be shown; only the
+    #               cache_size most recently used item bitmaps are kept, so memory
+    #               and scroll latency do not depend on the length of the list.
+    # hardware_pan: auto_pan() lets the SSD1306 scroll engine move rows that fit
+    #               in the display ram as a continuous marquee (no bus traffic
+    #               per step). Wider rows are always panned in software.
+    # pan_frames:   marquee speed, in frames per column (see SSD1306.SCROLL_INTERVALS)
     class ScrollingList:
-        def __init__(self, ssd1306, list, font):
+        CACHE_SIZE = 8   # Default nr of rendered items kept
+
+        def __init__(self, ssd1306, list, font, hardware_pan=False, pan_frames=5, cache_size=CACHE_SIZE):
             self.ssd1306 = ssd1306
             self.list = list
+            if hasattr(list, "__getitem__") and hasattr(list, "__len__"):
+                self.items = list
+                self.iterator = None
+            else:
+                self.items = []   # the items read from the iterator so far
+                self.iterator = iter(list)
             self.font = font
             self.position = 0 # row index into list, 0 to len(list) * self.rows - 1
             self.offset = 0   # led hardware scroll offset
             self.pan_row = -1
             self.pan_offset = 0
             self.pan_direction = 1
-            self.bitmaps = []
+            self.hardware_pan = hardware_pan
+            self.pan_frames = pan_frames
+            self.hardware_pan_row = -1 # row moved by the scroll engine, -1 if none
+            self.cache_size = max(cache_size, 3) # current item and both neighbours
+            self.bitmaps = collections.OrderedDict() # item index to rendered bitmap, LRU first
+            self.last_step = 1
             self.rows = ssd1306.rows
             self.cols = ssd1306.cols
             self.bufrows = self.rows * 2
-            downset = (self.rows - font.char_height)/2
-            for text in list:
-                width = ssd1306.cols
-                text_bitmap = ssd1306.Bitmap(width, self.rows)
-                width = text_bitmap.draw_text(0,downset,text,font)
-                if width > 128:
-                    text_bitmap = ssd1306.Bitmap(width+15, self.rows)
-                    text_bitmap.draw_text(0,downset,text,font)
-                self.bitmaps.append(text_bitmap)
-                
+            self.downset = (self.rows - font.char_height)//2
+            if not self.has_item(0):
+                raise ValueError("ScrollingList needs at least 1 item")
+
             # display the first word in the first position
-            self.ssd1306.display_block(self.bitmaps[0], 0, 0, self.cols)
+            self.ssd1306.display_block(self.bitmap(0), 0, 0, self.cols)
+
+        # True if item n exists (reads the iterator up to item n)
+        def has_item(self, n):
+            if self.iterator is not None:
+                while len(self.items) <= n:
+                    try:
+                        self.items.append(next(self.iterator))
+                    except StopIteration:
+                        self.iterator = None
+                        break
+            return n < len(self.items)
+
+        # Nr of items; reads an iterator to the end
+        def item_count(self):
+            while self.iterator is not None:
+                self.has_item(len(self.items))
+            return len(self.items)
+
+        # Index of the item step (1 or -1) after item n, wrapping around
+        def next_item(self, n, step):
+            if step > 0:
+                return n + 1 if self.has_item(n + 1) else 0
+            return n - 1 if n > 0 else self.item_count() - 1
+
+        # The bitmap of item n, rendered if it is not in the cache
+        def bitmap(self, n):
+            text_bitmap = self.bitmaps.pop(n, None)
+            if text_bitmap is None:
+                text_bitmap = self.render(self.items[n])
+                while len(self.bitmaps) >= self.cache_size:
+                    self.bitmaps.popitem(last=False)
+            self.bitmaps[n] = text_bitmap
+            return text_bitmap
+
+        def render(self, text):
+            width = self.ssd1306.text_width(text, self.font)
+            text_bitmap = self.ssd1306.Bitmap(width + 15 if width > 128 else self.cols, self.rows)
+            text_bitmap.draw_text(0, self.downset, text, self.font)
+            return text_bitmap
+
+        # Renders the item the next scroll step in the last direction will show,
+        # if it is not rendered yet. Call it when idle (auto_pan() and align() do),
+        # so scrolling finds the item ready.
+        def prefetch(self):
+            n = self.position // self.rows
+            if n == 0 and self.last_step < 0 and self.iterator is not None:
+                # the item before the first is the last: not read ahead, as that
+                # reads the iterator to its end (which may never come)
+                return
+            m = self.next_item(n, self.last_step)
+            if m not in self.bitmaps:
+                self.bitmap(m)
+                # keep the current item the most recently used
+                self.bitmap(self.position // self.rows)
     
         # how many steps to the nearest home position
         def align_offset(self):
             pos = self.position % self.rows
-            midway = (self.rows/2)
+            midway = (self.rows//2)
             delta = (pos + midway) % self.rows - midway
             return -delta
 
@@ -436,44 +1253,61 @@ class SSD1306:
             delta = self.align_offset()
             if delta!=0:
                 steps = abs(delta)
-                sign = delta/steps
+                sign = delta//steps
                 for i in range(0,steps):
                     if i>0 and delay>0:
                         time.sleep(delay)
                     self.scroll(sign)
-            return self.position / self.rows
+            self.prefetch()
+            return self.position // self.rows
     
         # scroll up or down.  Does multiple one-pixel scrolls if delta is not >1 or <-1
         def scroll(self, delta):
             if delta == 0:
                 return
     
-            count = len(self.list)
-            step = cmp(delta, 0)
+            step = 1 if delta > 0 else -1
             for i in range(0,delta, step):
-                if (self.position % self.rows) == 0:
-                    n = self.position / self.rows
-                    # at even boundary, need to update hidden row
-                    m = (n + step + count) % count
-                    row = (self.offset + self.rows) % self.bufrows
-                    self.ssd1306.display_block(self.bitmaps[m], row, 0, self.cols)
-                    if m == self.pan_row:
-                        self.pan_offset = 0
-                self.offset = (self.offset + self.bufrows + step) % self.bufrows
-                self.ssd1306.command(self.ssd1306.SET_START_LINE | self.offset)
-                max_position = count * self.rows
-                self.position = (self.position + max_position + step) % max_position
+                self.scroll_step(step)
+
+        # one-pixel scroll, step is 1 or -1
+        def scroll_step(self, step):
+            self.stop_hardware_pan()
+            self.last_step = step
+            n = self.position // self.rows
+            if (self.position % self.rows) == 0:
+                # at even boundary, need to update hidden row
+                m = self.next_item(n, step)
+                row = (self.offset + self.rows) % self.bufrows
+                self.ssd1306.display_block(self.bitmap(m), row, 0, self.cols)
+                if m == self.pan_row:
+                    self.pan_offset = 0
+            self.offset = (self.offset + self.bufrows + step) % self.bufrows
+            self.ssd1306.command(self.ssd1306.SET_START_LINE | self.offset)
+            self.position += step
+            if self.position < 0:
+                self.position = self.item_count() * self.rows - 1
+            elif step > 0 and self.position % self.rows == 0 and not self.has_item(self.position // self.rows):
+                self.position = 0   # wrapped around to the first item
     
         # pans the current row back and forth repeatedly.
         # Note that this currently only works if we are at a home position.
         def auto_pan(self):
-            n = self.position / self.rows
+            n = self.position // self.rows
             if n != self.pan_row:
                 self.pan_row = n
                 self.pan_offset = 0
                 
-            text_bitmap = self.bitmaps[n]
-            if text_bitmap.cols > self.cols:
+            text_bitmap = self.bitmap(n)
+            if text_bitmap.cols <= self.cols:
+                if self.hardware_pan and self.hardware_pan_row != n:
+                    self.stop_hardware_pan()
+                    page = self.offset >> 3 # this only works if we are at a home position
+                    self.ssd1306.start_scroll(page & 0x07, (page + (self.rows >> 3) - 1) & 0x07,
+                                              self.pan_frames, self.ssd1306.SCROLL_LEFT)
+                    self.hardware_pan_row = n
+            else:
+                self.stop_hardware_pan()
                 row = self.offset # this only works if we are at a home position
                 if self.pan_direction > 0:
                     if self.pan_offset <= (text_bitmap.cols - self.cols):
@@ -486,4 +1320,12 @@ class SSD1306:
                     else:
                         self.pan_direction = 1
                 self.ssd1306.display_block(text_bitmap, row, 0, self.cols, self.pan_offset)
-    
\ No newline at end of file
+            self.prefetch()
+
+        # Stops the marquee of hardware_pan and restores the row it moved
+        def stop_hardware_pan(self):
+            if self.hardware_pan_row < 0:
+                return
+            self.ssd1306.stop_scroll()
+            self.ssd1306.display_block(self.bitmap(self.hardware_pan_row), self.offset, 0, self.cols)
+            self.hardware_pan_row = -1
@@ -6,11 +6,23 @@
 #--------------------------------------------------------------------------
 
 import ff32ssd1306
+import ff32dashboard
 import ff32ds18b20
+import ff32fonts
+import importlib
 import time
 import sys
-import arial_16
-import arial_24
+
+# Loads the font file name.ff32f (see ff32fonts), which is much faster than
+# importing the font module; falls back to the module when there is no file
+def load_font(name):
+    try:
+        return ff32fonts.load(name + ".ff32f")
+    except (IOError, OSError):
+        return importlib.import_module(name)
+
+arial_16 = load_font("arial_16")
+arial_24 = load_font("arial_24")
 
 fonts = []
 fonts += [arial_16,
@@ -32,21 +44,22 @@ time.sleep(0.5)
 oled.normal_display()
 time.sleep(0.5)
 
-while True:
-    # retrieve current date and time
-    text = time.strftime("%d%b %H:%M")
-    # wipe area and show date/time
-    oled.clear_block(0,0,128,16)
-    textSize = oled.draw_text3(0,0,text,arial_16)
-    # retrieve sensor temperature
-    temperature=sensor.Read_Temp()
-    temperaturestr = "{:.1f}".format(temperature)
-    # wipe area and show temperature
-    oled.clear_block(0,40,128,60)
-    textSize=oled.draw_text3(0,40,temperaturestr+" "+chr(127)+"C",arial_24)
-    # show all to the oled
-    oled.display()
-    time.sleep(1)
-
-
+# the date/time and the temperature each get a region of the display. The sensor
+# is read on a worker thread, so the dashboard keeps its schedule, and a region
+# is only redrawn and sent when its text changes.
+def read_temperature():
+    # the sensor uses the FF32 of the display, 1-wire on a pin of its own, so
+    # the read holds the session lock. ff32ds18b20 only offers Read_Temp(), which
+    # includes the conversion wait, so the display waits for the conversion too;
+    # locking just the transfers would need a hook in the sensor driver. The
+    # driver may have reconfigured the FF32, so the display reprograms its I2C
+    # pins at its next write.
+    with oled.session.lock:
+        temperature = sensor.Read_Temp()
+        oled.session.invalidate_pins()
+    return temperature
 
+dashboard = ff32dashboard.Dashboard(oled)
+dashboard.add("clock", lambda: time.strftime("%d%b %H:%M"), 1, (0,0,128,16), arial_16)
+dashboard.add("temperature", read_temperature, 1, (0,40,128,24), arial_24, "{:.1f} "+chr(127)+"C")
+dashboard.run()
@@ -0,0 +1,446 @@
+#-----------------------------------------------------------------------------------------
+# test_ff32.py
+# About:
+# Tests of the driver against ff32emu.EmulatedFF32: what ends up on the emulated panel
+# and how many I2C transactions it took. Needs no FF32 and no font modules.
+#
+# Usage:
+#   python -m unittest test_ff32
+#   python -m pytest test_ff32.py
+#-----------------------------------------------------------------------------------------
+
+import itertools
+import os
+import random
+import shutil
+import tempfile
+import threading
+import unittest
+
+import ff32dashboard
+import ff32emu
+import ff32fonts
+import ff32frames
+import ff32ssd1306
+
+try:
+    import ff32numpy
+except ImportError:
+    ff32numpy = None
+
+# Small proportional font with the attributes of the font modules (like arial_16),
+# glyphs made of pseudo random rows
+class SmallFont:
+
+    char_height = 12
+    start_char = "!"
+    end_char = "~"
+    space_width = 3
+    gap_width = 1
+
+    def __init__(self):
+        count = ord(self.end_char) - ord(self.start_char) + 1
+        r = random.Random(16)
+        self.descriptors = []
+        self.bitmaps = []
+        for pos in range(0, count):
+            width = 3 + pos % 9
+            self.descriptors.append((width, len(self.bitmaps)))
+            for row in range(0, self.char_height):
+                for i in range(0, (width + 7) // 8):
+                    self.bitmaps.append(r.randrange(256))
+        self.kerning = [[(prev + pos) % 3 - 1 for pos in range(0, count)] for prev in range(0, count)]
+
+# The ScrollingList of the original driver: renders every item up front, for lists
+class ReferenceScrollingList:
+
+    def __init__(self, ssd1306, list, font):
+        self.ssd1306 = ssd1306
+        self.list = list
+        self.position = 0
+        self.offset = 0
+        self.pan_row = -1
+        self.pan_offset = 0
+        self.pan_direction = 1
+        self.bitmaps = []
+        self.rows = ssd1306.rows
+        self.cols = ssd1306.cols
+        self.bufrows = self.rows * 2
+        downset = (self.rows - font.char_height) // 2
+        for text in list:
+            text_bitmap = ssd1306.Bitmap(ssd1306.cols, self.rows)
+            width = text_bitmap.draw_text(0, downset, text, font)
+            if width > 128:
+                text_bitmap = ssd1306.Bitmap(width + 15, self.rows)
+                text_bitmap.draw_text(0, downset, text, font)
+            self.bitmaps.append(text_bitmap)
+        self.ssd1306.display_block(self.bitmaps[0], 0, 0, self.cols)
+
+    def align(self):
+        pos = self.position % self.rows
+        midway = self.rows // 2
+        delta = -((pos + midway) % self.rows - midway)
+        if delta != 0:
+            steps = abs(delta)
+            sign = delta // steps
+            for i in range(0, steps):
+                self.scroll(sign)
+        return self.position // self.rows
+
+    def scroll(self, delta):
+        count = len(self.list)
+        step = 1 if delta > 0 else -1
+        for i in range(0, delta, step):
+            if (self.position % self.rows) == 0:
+                n = self.position // self.rows
+                m = (n + step + count) % count
+                row = (self.offset + self.rows) % self.bufrows
+                self.ssd1306.display_block(self.bitmaps[m], row, 0, self.cols)
+                if m == self.pan_row:
+                    self.pan_offset = 0
+            self.offset = (self.offset + self.bufrows + step) % self.bufrows
+            self.ssd1306.command(self.ssd1306.SET_START_LINE | self.offset)
+            max_position = count * self.rows
+            self.position = (self.position + max_position + step) % max_position
+
+    def auto_pan(self):
+        n = self.position // self.rows
+        if n != self.pan_row:
+            self.pan_row = n
+            self.pan_offset = 0
+        text_bitmap = self.bitmaps[n]
+        if text_bitmap.cols > self.cols:
+            if self.pan_direction > 0:
+                if self.pan_offset <= (text_bitmap.cols - self.cols):
+                    self.pan_offset += 1
+                else:
+                    self.pan_direction = -1
+            else:
+                if self.pan_offset > 0:
+                    self.pan_offset -= 1
+                else:
+                    self.pan_direction = 1
+            self.ssd1306.display_block(text_bitmap, self.offset, 0, self.cols, self.pan_offset)
+
+# Draws a few random shapes on bitmap (a Bitmap or SSD1306)
+def scribble(target, r):
+    for i in range(0, r.randrange(1, 6)):
+        op = r.randrange(3)
+        shape = r.randrange(4)
+        (x, y) = (r.randrange(-10, 130), r.randrange(-10, 70))
+        if shape == 0:
+            target.fill_rect(x, y, r.randrange(1, 40), r.randrange(1, 30), op)
+        elif shape == 1:
+            target.line(x, y, r.randrange(-10, 130), r.randrange(-10, 70), op)
+        elif shape == 2:
+            target.circle(x, y, r.randrange(0, 30), op)
+        else:
+            target.fill_circle(x, y, r.randrange(0, 30), op)
+
+class EmulatorTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.transport = ff32emu.EmulatedFF32()
+        self.oled = self.display()
+        self.panel = self.transport.panel()
+
+    def display(self, **kwargs):
+        oled = ff32ssd1306.SSD1306(session=self.transport, **kwargs)
+        oled.begin()
+        return oled
+
+    def assertPanelShows(self, data):
+        self.assertEqual(self.panel.ram_columns(8), bytearray(data))
+
+class DisplayTest(EmulatorTestCase):
+
+    def test_partial_updates_match_the_bitmap(self):
+        r = random.Random(11)
+        self.oled.display()
+        for i in range(0, 30):
+            scribble(self.oled, r)
+            self.oled.display()
+            self.assertPanelShows(self.oled.bitmap.data)
+
+    def test_small_change_sends_less_than_a_frame(self):
+        self.oled.display()
+        self.transport.reset_counters()
+        self.oled.clear_display()
+        self.oled.fill_rect(0, 0, 128, 64)
+        self.oled.display()
+        frame = self.transport.transactions
+        self.transport.reset_counters()
+        self.oled.draw_pixel(70, 20, False)
+        self.oled.display()
+        self.assertPanelShows(self.oled.bitmap.data)
+        self.assertLess(self.transport.transactions, frame)
+        self.transport.reset_counters()
+        self.oled.display()
+        self.assertEqual(self.transport.transactions, 0)
+
+    # The scroll engine moves the display ram: no partial updates while it runs
+    def test_scrolling_display_sends_full_frames(self):
+        self.oled.display()
+        self.oled.start_scroll()
+        self.oled.display()
+        self.transport.reset_counters()
+        self.oled.draw_pixel(70, 20)
+        self.oled.display()
+        full_frame = (1024 + self.oled.DATA_CHUNK - 1) // self.oled.DATA_CHUNK
+        self.assertGreaterEqual(self.transport.transactions, full_frame)
+        self.oled.stop_scroll()
+        self.oled.display()
+        self.transport.reset_counters()
+        self.oled.draw_pixel(71, 20)
+        self.oled.display()
+        self.assertLess(self.transport.transactions, full_frame)
+        self.assertPanelShows(self.oled.bitmap.data)
+
+    def test_threaded_writer_ends_with_the_last_frame(self):
+        oled = self.display(threaded=True)
+        r = random.Random(12)
+        for i in range(0, 20):
+            scribble(oled, r)
+            oled.display()
+        oled.flush()
+        self.assertPanelShows(oled.bitmap.data)
+        oled.close()
+
+@unittest.skipIf(ff32numpy is None, "needs numpy")
+class NumpyBitmapTest(unittest.TestCase):
+
+    # The same random drawing must give the same bytes as the Python Bitmap
+    def test_drawing_matches_bitmap(self):
+        r = random.Random(18)
+        for i in range(0, 200):
+            expected = ff32ssd1306.SSD1306.Bitmap(128, 64)
+            actual = ff32numpy.NumpyBitmap(128, 64)
+            state = r.getstate()
+            scribble(expected, r)
+            r.setstate(state)
+            scribble(actual, r)
+            self.assertEqual(actual.data, expected.data)
+
+class PinsTest(unittest.TestCase):
+
+    def test_pins_are_set_once_per_change(self):
+        transport = ff32emu.EmulatedFF32()
+        first = ff32ssd1306.SSD1306(session=transport)
+        second = ff32ssd1306.SSD1306(slave_addr=0x3D, session=transport)
+        self.assertEqual(transport.pin_writes, 1)
+        other = ff32ssd1306.SSD1306(session=transport, scl_pin=("B", 1), sda_pin=("B", 2))
+        first.command(first.DISPLAY_ON)
+        second.command(second.DISPLAY_ON)
+        self.assertEqual(transport.pin_writes, 3)
+        # an explicit select() always reprograms the pins
+        second.select()
+        self.assertEqual(transport.pin_writes, 4)
+
+class RegisterModelTest(EmulatorTestCase):
+
+    def test_repeated_contrast_is_skipped(self):
+        self.transport.reset_counters()
+        self.oled.set_contrast(0x10)
+        self.assertEqual(self.transport.transactions, 1)
+        self.oled.set_contrast(0x10)
+        self.assertEqual(self.transport.transactions, 1)
+        self.oled.set_contrast(0x20)
+        self.assertEqual(self.transport.transactions, 2)
+        self.assertEqual(self.panel.contrast, 0x20)
+
+    def test_repeated_window_is_not_set_up_again(self):
+        bitmap = self.oled.Bitmap(16, 16)
+        bitmap.fill_block(0, 0, 16, 16)
+        self.transport.reset_counters()
+        self.oled.display_block(bitmap, 8, 32, 16)
+        first = self.transport.transactions
+        self.transport.reset_counters()
+        self.oled.display_block(bitmap, 8, 32, 16)
+        self.assertLess(self.transport.transactions, first)
+        self.assertEqual(self.panel.ram_pixel(40, 20), 1)
+
+    # Several commands in one command() call all update the model
+    def test_command_stream_updates_every_register(self):
+        self.oled.display()
+        block = self.oled.Bitmap(16, 8)
+        block.fill_block(0, 0, 16, 8)
+        self.oled.display_block(block, 0, 32, 16)
+        self.oled.command(self.oled.SET_PAGE_ADDRESS, 0, 0, self.oled.SET_COL_ADDRESS, 0, 127)
+        block.clear_block(0, 0, 8, 8)
+        self.oled.display_block(block, 0, 32, 16)
+        expected = self.oled.Bitmap(128, 64)
+        expected.fill_block(40, 0, 8, 8)
+        self.assertPanelShows(expected.data)
+
+    def test_invalidate_sends_again(self):
+        self.oled.set_contrast(0x10)
+        self.oled.invert_display()
+        self.oled.invalidate()
+        self.transport.reset_counters()
+        self.oled.set_contrast(0x10)
+        self.oled.invert_display()
+        self.assertEqual(self.transport.transactions, 2)
+        self.assertTrue(self.panel.inverted)
+
+class ScrollingListTest(EmulatorTestCase):
+
+    ITEMS = ["alpha", "a much longer entry that pans across the screen", "c", "dee", "e e e"]
+
+    # Runs the same random scroll, align and auto_pan calls on a ScrollingList of
+    # items and on the reference, each on its own panel; they must show the same
+    def compare(self, items, **kwargs):
+        font = SmallFont()
+        scroller = ff32ssd1306.SSD1306.ScrollingList(self.oled, items, font, **kwargs)
+        reference_transport = ff32emu.EmulatedFF32()
+        reference_oled = ff32ssd1306.SSD1306(session=reference_transport)
+        reference_oled.begin()
+        reference = ReferenceScrollingList(reference_oled, self.ITEMS, font)
+        reference_panel = reference_transport.panel()
+        r = random.Random(5)
+        for i in range(0, 60):
+            op = r.randrange(4)
+            if op == 0:
+                delta = r.choice([1, -1, 7, -7, 64, -64, 130, -200])
+                scroller.scroll(delta)
+                reference.scroll(delta)
+            elif op == 1:
+                self.assertEqual(scroller.align(0), reference.align())
+            elif op == 2:
+                scroller.align(0)
+                reference.align()
+                for j in range(0, r.randrange(1, 30)):
+                    scroller.auto_pan()
+                    reference.auto_pan()
+            else:
+                delta = r.choice([-1, 1])
+                scroller.scroll(delta)
+                reference.scroll(delta)
+            self.assertEqual(scroller.position, reference.position)
+            self.assertEqual(self.panel.screen(), reference_panel.screen())
+        return scroller
+
+    def test_list_matches_reference(self):
+        self.compare(list(self.ITEMS))
+
+    def test_iterator_matches_reference(self):
+        scroller = self.compare(iter(self.ITEMS), cache_size=3)
+        self.assertLessEqual(len(scroller.bitmaps), 3)
+
+    def test_endless_iterator_is_not_read_ahead(self):
+        items = ("item %d" % i for i in itertools.count())
+        scroller = ff32ssd1306.SSD1306.ScrollingList(self.oled, items, SmallFont())
+        scroller.scroll(64)
+        scroller.scroll(-64)
+        self.assertEqual(scroller.align(0), 0)
+        scroller.auto_pan()
+        self.assertLessEqual(len(scroller.items), 3)
+
+    def test_empty_list(self):
+        self.assertRaises(ValueError, ff32ssd1306.SSD1306.ScrollingList, self.oled, [], SmallFont())
+
+class FontFileTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_font_file_draws_like_the_font(self):
+        font = SmallFont()
+        path = os.path.join(self.directory, "test.ff32f")
+        ff32fonts.convert(font, path)
+        loaded = ff32fonts.load(path)
+        text = "Hello, World! ~{kerning}~"
+        for size in (1, 2):
+            expected = ff32ssd1306.SSD1306.Bitmap(256, 32)
+            actual = ff32ssd1306.SSD1306.Bitmap(256, 32)
+            self.assertEqual(actual.draw_text(1, 3, text, loaded, size), expected.draw_text(1, 3, text, font, size))
+            self.assertEqual(actual.data, expected.data)
+            self.assertEqual(actual.text_width(text, loaded, size), expected.text_width(text, font, size))
+        loaded.close()
+
+class FramesTest(EmulatorTestCase):
+
+    def setUp(self):
+        EmulatorTestCase.setUp(self)
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_playback_shows_every_frame(self):
+        path = os.path.join(self.directory, "test.ff32a")
+        r = random.Random(20)
+        frames = []
+        with ff32frames.Recorder(path, interval=0) as recorder:
+            bitmap = ff32ssd1306.SSD1306.Bitmap(128, 64)
+            for i in range(0, 12):
+                scribble(bitmap, r)
+                # every frame differs, so every frame sends data
+                bitmap.invert_block(i, 0, 1, 1)
+                recorder.add(bitmap)
+                frames.append(bytearray(bitmap.data))
+        shown = []
+        send_commands = self.oled.send_commands
+        def record(messages):
+            send_commands(messages)
+            # frames, not the commands play() sends itself
+            if [message for message in messages if message[0] == self.oled.DATA_MODE]:
+                shown.append(self.panel.ram_columns(8))
+        self.oled.send_commands = record
+        ff32frames.Player(path).play(self.oled, loops=2)
+        del self.oled.send_commands
+        self.assertEqual(shown, frames + frames)
+        # the ram no longer holds the bitmap: the next display() sends it all
+        self.oled.display()
+        self.assertPanelShows(self.oled.bitmap.data)
+
+class DashboardTest(EmulatorTestCase):
+
+    def test_sources_are_read_at_their_interval(self):
+        dashboard = ff32dashboard.Dashboard(self.oled)
+        widget = dashboard.add("value", lambda: 1, 1.0, (0, 0, 128, 16), SmallFont())
+        reads = []
+        for now in (100.0, 100.75, 101.0, 101.5, 102.25, 105.5, 106.0):
+            dashboard.poll(now)
+            if widget.polling:
+                reads.append(now)
+                widget.polling = False
+        # on schedule from the first read on; a source that fell a whole interval
+        # behind is read again at once, and on schedule from then on
+        self.assertEqual(reads, [100.0, 101.0, 102.25, 105.5, 106.0])
+        self.assertEqual(widget.next_poll, 106.5)
+
+    def test_widget_is_redrawn_when_its_text_changes(self):
+        values = [1, 1, 2]
+        dashboard = ff32dashboard.Dashboard(self.oled)
+        widget = dashboard.add("value", lambda: values.pop(0), 0, (0, 16, 64, 16), SmallFont(), "{}!")
+        dashboard.start()
+        try:
+            for i in range(0, 3):
+                while widget.polls == i or widget.polling:
+                    dashboard.step(1.0)
+        finally:
+            dashboard.stop()
+        self.assertEqual((widget.text, widget.redraws), ("2!", 2))
+        self.assertPanelShows(self.oled.bitmap.data)
+
+    # A stop() from another thread ends run(), also when it lands between rounds
+    def test_stop_from_another_thread_ends_run(self):
+        dashboard = ff32dashboard.Dashboard(self.oled)
+        dashboard.add("value", lambda: 1, 0.01, (0, 0, 128, 16), SmallFont())
+        step = dashboard.step
+        def stop_between_rounds(timeout=None):
+            dashboard.stop()
+            return step(timeout)
+        dashboard.step = stop_between_rounds
+        thread = threading.Thread(target=dashboard.run)
+        thread.daemon = True
+        thread.start()
+        thread.join(5)
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(dashboard.threads, [])
+
+if __name__ == "__main__":
+    unittest.main()
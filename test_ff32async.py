@@ -0,0 +1,64 @@
+#-----------------------------------------------------------------------------------------
+# test_ff32async.py
+# About:
+# Tests of ff32async against ff32emu.EmulatedFF32. Requires Python 3.5 or later,
+# like ff32async itself.
+#
+# Usage:
+#   python -m unittest test_ff32async
+#-----------------------------------------------------------------------------------------
+
+import asyncio
+import threading
+import unittest
+
+import ff32async
+import ff32emu
+import ff32ssd1306
+
+# Emulated FF32 that pauses after the first data write once pause is set, until
+# resume is set; for drawing at a known point of a transfer
+class PausingFF32(ff32emu.EmulatedFF32):
+
+    def __init__(self):
+        ff32emu.EmulatedFF32.__init__(self)
+        self.pause = False
+        self.paused = threading.Event()
+        self.resume = threading.Event()
+
+    def _write(self, slave_addr, data):
+        ff32emu.EmulatedFF32._write(self, slave_addr, data)
+        if self.pause and data[0] == ff32ssd1306.SSD1306.DATA_MODE:
+            self.pause = False
+            self.paused.set()
+            self.resume.wait(5)
+
+class AsyncTest(unittest.TestCase):
+
+    # One coroutine draws into a part of the bitmap that the frame another one
+    # awaits has already sent; the next display() must still send it
+    def test_drawing_during_display_is_kept(self):
+        transport = PausingFF32()
+        oled = ff32async.AsyncSSD1306(ff32ssd1306.SSD1306(session=transport))
+        ssd1306 = oled.ssd1306
+        async def draw():
+            await loop.run_in_executor(None, transport.paused.wait, 5)
+            ssd1306.fill_rect(0, 0, 8, 8, ssd1306.BLOCK_CLEAR)
+            transport.resume.set()
+        async def main():
+            await oled.begin()
+            ssd1306.fill_rect(0, 0, 128, 64)
+            transport.pause = True
+            await asyncio.gather(oled.display(), draw())
+            await oled.display()
+            await oled.close()
+        loop = asyncio.new_event_loop()
+        try:
+            loop.run_until_complete(main())
+        finally:
+            loop.close()
+        self.assertTrue(transport.paused.is_set())
+        self.assertEqual(transport.panel().ram_columns(8), ssd1306.bitmap.data)
+
+if __name__ == "__main__":
+    unittest.main()